@@ -0,0 +1,26 @@
+"""Add row version to item and user
+
+Revision ID: 3f6a2b9c1e57
+Revises: 8e4c1d7b2f60
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a2b9c1e57'
+down_revision = '8e4c1d7b2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('item', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('user', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'version')
+    op.drop_column('item', 'version')
@@ -0,0 +1,24 @@
+"""Add user token_version
+
+Revision ID: 5b7f3c2a9d41
+Revises: 1a31ce608336
+Create Date: 2026-10-19 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7f3c2a9d41'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'token_version')
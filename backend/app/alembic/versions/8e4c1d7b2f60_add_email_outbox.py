@@ -0,0 +1,46 @@
+"""Add email outbox
+
+Revision ID: 8e4c1d7b2f60
+Revises: 5b7f3c2a9d41
+Create Date: 2026-10-19 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4c1d7b2f60'
+down_revision = '5b7f3c2a9d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('email_to', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('subject', sqlmodel.sql.sqltypes.AutoString(length=998), nullable=False),
+        sa.Column('html_content', sa.Text(), nullable=False),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_email_outbox_pending',
+        'email_outbox',
+        ['next_attempt_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_pending', table_name='email_outbox', postgresql_where=sa.text("status = 'pending'"))
+    op.drop_table('email_outbox')
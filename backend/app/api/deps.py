@@ -1,44 +1,182 @@
-from collections.abc import Generator
+import uuid
+from collections.abc import Callable, Generator
 from typing import Annotated
 
-import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
 
 from app.core import security
+from app.core.auth_cache import token_version_cache, user_auth_cache
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import ReadOnlySession, engine, read_only_engine, replica_router
+from app.core.limiter import ConcurrencyLimiter
+from app.core.metrics import AUTH_LOOKUPS
+from app.models import AuthUser, ItemPublic, TokenPayload, User, UserPublic
+from app.repositories import user_repository
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# 写请求之后设置，在有效期内该客户端的读请求固定走主库（read-your-writes）
+READ_PRIMARY_COOKIE = "read_primary"
+# get_db 在 request.state 上设置该标记，由 ReadYourWritesMiddleware 写入 cookie
+READ_PRIMARY_STATE = "read_primary"
+# 客户端也可以显式要求读主库，适用于不保存 cookie 的 API 调用方
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    if (
+        request.method not in SAFE_METHODS
+        and replica_router.engines
+        and settings.READ_YOUR_WRITES_SECONDS > 0
+    ):
+        # 不能设置在注入的 Response 上：处理函数直接返回 Response 时（serialized_success 等）
+        # FastAPI 不会合并它的 cookie
+        setattr(request.state, READ_PRIMARY_STATE, True)
+    # 工作单元：每个请求一个事务，处理函数正常返回后统一提交一次；
+    # 连接在第一条语句执行时才取出，从未访问数据库的请求不会占用连接池；
+    # 抛出的异常（HTTPException、AppException 等）会先回滚事务，再交给异常处理器。
+    # 提交在响应发送之前完成（见 SessionDep 的 scope），提交失败时返回 500。
+    # 提交后不过期已加载的对象，避免序列化响应时逐行重新 SELECT
+    with Session(engine, expire_on_commit=False) as session, session.begin():
+        yield session
+
+
+def _wants_primary(request: Request) -> bool:
+    return (
+        request.method not in SAFE_METHODS
+        or READ_PRIMARY_COOKIE in request.cookies
+        or request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary"
+    )
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    只读会话：轮询路由到健康的只读副本
+
+    写请求、刚写入过的客户端以及没有可用副本时回退到主库。
+    使用副本前先取出一次连接（pool_pre_ping 会探测连接），连接失败时将其标记为
+    不可用并尝试下一个副本，请求不会因为副本宕机而失败。
+    会话每条语句执行完立即归还连接，不会在整个请求期间占用连接。
+    """
+    replica = None if _wants_primary(request) else replica_router.get_engine()
+    while replica is not None:
+        try:
+            with replica.connect():
+                break
+        except OperationalError:
+            # handle_error 监听器通常已经摘除该副本，这里兜底
+            if replica_router.is_healthy(replica):
+                replica_router.mark_down(replica)
+            replica = replica_router.get_engine()
+    with ReadOnlySession(replica or read_only_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_primary_read_db() -> Generator[Session, None, None]:
+    """主库上的只读会话，用于不能容忍副本延迟的读取（如鉴权）"""
+    with ReadOnlySession(read_only_engine, expire_on_commit=False) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+# scope="function"：处理函数返回后、发送响应之前退出依赖（提交事务）；
+# 默认的 request 作用域在响应发送之后才提交，提交失败时客户端已收到 200
+SessionDep = Annotated[Session, Depends(get_db, scope="function")]
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+PrimaryReadSessionDep = Annotated[Session, Depends(get_primary_read_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def get_current_principal(session: PrimaryReadSessionDep, token: TokenDep) -> AuthUser:
+    """
+    解析 token 并返回鉴权所需的用户信息
+
+    命中进程内缓存时不访问数据库，只依赖 id/is_active/is_superuser 的路由应使用它。
+    自包含令牌只核对版本号，直接使用令牌中的声明。
+    """
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
+        token_data = security.decode_access_token(token)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    if token_data.ver is not None:
+        AUTH_LOOKUPS.labels("claims").inc()
+        principal = _principal_from_claims(session, token_data)
+    else:
+        principal = _principal_from_cache(session, token_data)
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
+def _principal_from_claims(session: Session, token_data: TokenPayload) -> AuthUser:
+    # 自包含令牌必须携带 sub 和全部 TOKEN_CLAIM_FIELDS，缺少声明的令牌按无效凭据处理
+    if (
+        token_data.sub is None
+        or token_data.email is None
+        or token_data.is_active is None
+        or token_data.is_superuser is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    try:
+        user_id = uuid.UUID(token_data.sub)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    key = str(user_id)
+    version = token_version_cache.get(key)
+    if version is None:
+        version = user_repository.get_token_version(session, id=user_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        token_version_cache.set(key, version)
+    if version != token_data.ver:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token has been revoked",
+        )
+    return AuthUser(
+        id=user_id,
+        email=token_data.email,
+        is_active=token_data.is_active,
+        is_superuser=token_data.is_superuser,
+    )
+
+
+def _principal_from_cache(session: Session, token_data: TokenPayload) -> AuthUser:
+    principal = user_auth_cache.get(str(token_data.sub))
+    AUTH_LOOKUPS.labels("db" if principal is None else "cache").inc()
+    if principal is None:
+        user = session.get(User, token_data.sub)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = AuthUser.model_validate(user)
+        user_auth_cache.set(str(user.id), principal)
+    return principal
+
+
+CurrentPrincipal = Annotated[AuthUser, Depends(get_current_principal)]
+
+
+def get_current_user(session: PrimaryReadSessionDep, principal: CurrentPrincipal) -> User:
+    """返回当前用户的完整数据库记录"""
+    user = session.get(User, principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -49,9 +187,63 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+def get_current_active_superuser(current_user: CurrentPrincipal) -> AuthUser:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+def sparse_fields(
+    model: type[SQLModel],
+) -> Callable[[str | None], tuple[str, ...] | None]:
+    """
+    fields= 查询参数（稀疏字段集）的依赖
+
+    逗号分隔的字段名按公开模型 model 校验，返回按模型字段顺序排列的元组；
+    未传时返回 None（返回全部字段）。包含未知字段时按请求参数校验失败处理（422）。
+    """
+    allowed = tuple(model.model_fields)
+
+    def dependency(
+        fields: Annotated[
+            str | None,
+            Query(description=f"只返回这些字段，逗号分隔，可选：{','.join(allowed)}"),
+        ] = None,
+    ) -> tuple[str, ...] | None:
+        if fields is None:
+            return None
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(requested.difference(allowed))
+        if unknown or not requested:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "value_error",
+                        "loc": ("query", "fields"),
+                        "msg": f"Unknown fields: {', '.join(unknown)}"
+                        if unknown
+                        else "At least one field is required",
+                        "input": fields,
+                    }
+                ]
+            )
+        return tuple(name for name in allowed if name in requested)
+
+    return dependency
+
+
+ItemFieldsDep = Annotated[tuple[str, ...] | None, Depends(sparse_fields(ItemPublic))]
+UserFieldsDep = Annotated[tuple[str, ...] | None, Depends(sparse_fields(UserPublic))]
+
+
+# 登录的独立并发限制：登录风暴只会让登录本身排队或返回 503，不会拖垮其他接口
+login_limiter = ConcurrencyLimiter(
+    "login", limit=settings.LOGIN_MAX_CONCURRENCY, timeout=settings.LOGIN_QUEUE_TIMEOUT
+)
+
+
+def limit_login_concurrency() -> Generator[None, None, None]:
+    with login_limiter.slot():
+        yield
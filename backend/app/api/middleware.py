@@ -0,0 +1,568 @@
+"""
+ASGI 中间件
+"""
+import functools
+import logging
+import random
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import anyio.to_thread
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.deps import (
+    READ_PRIMARY_COOKIE,
+    READ_PRIMARY_STATE,
+    SAFE_METHODS,
+    get_current_active_superuser,
+    get_current_principal,
+)
+from app.core.compression import ENCODINGS, Compressor, negotiate_encoding
+from app.core.config import settings
+from app.core.db import ReadOnlySession, read_only_engine
+from app.core.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+    THREADPOOL_BUSY,
+    THREADPOOL_SIZE,
+    THREADPOOL_WAITING,
+)
+from app.core.profiling import ProfileSession, profile_session_var, save_profile
+from app.core.request_context import (
+    RequestStats,
+    request_id_var,
+    request_scope_var,
+    request_stats_var,
+)
+from app.core.serialization import dumps
+from app.core.tracing import TRACEPARENT_HEADER, start_trace
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_HEADER_KEY = REQUEST_ID_HEADER.lower().encode()
+_MAX_REQUEST_ID_LENGTH = 128
+_DB_QUERIES_HEADER_KEY = b"x-db-queries"
+_DB_TIME_HEADER_KEY = b"x-db-time-ms"
+
+
+def _incoming_request_id(scope: Scope) -> str | None:
+    headers: list[tuple[bytes, bytes]] = scope["headers"]
+    for key, value in headers:
+        if key == _REQUEST_ID_HEADER_KEY:
+            # 只接受长度合理的可打印 ASCII，避免日志注入
+            if len(value) <= _MAX_REQUEST_ID_LENGTH and value.isascii():
+                request_id = value.decode()
+                if request_id.isprintable():
+                    return request_id
+            return None
+    return None
+
+
+def _route_id(scope: Scope, route_id: Callable[[APIRoute], str]) -> str | None:
+    # scope["route"] 在路由匹配后才写入；未匹配（404）或非业务路由返回 None
+    route = scope.get("route")
+    if isinstance(route, APIRoute) and route.tags:
+        return route_id(route)
+    return None
+
+
+def _warn_repeated_statements(
+    stats: RequestStats, method: str, path: str, route_id: str | None
+) -> None:
+    for statement, count in stats.repeated_statements(
+        settings.DB_REPEATED_QUERY_WARN_THRESHOLD
+    ):
+        logger.warning(
+            "Possible N+1 query in %s %s (%s): executed %d times: %s",
+            method,
+            path,
+            route_id,
+            count,
+            " ".join(statement.split())[:300],
+        )
+
+
+def _sample_rate(route_id: str | None) -> float:
+    if route_id is not None:
+        rate = settings.ACCESS_LOG_ROUTE_SAMPLE_RATES.get(route_id)
+        if rate is not None:
+            return rate
+    return settings.ACCESS_LOG_SAMPLE_RATE
+
+
+class AccessLogMiddleware:
+    """
+    请求 ID 与访问日志
+
+    沿用客户端传入的 X-Request-ID（否则生成一个），写入响应头和日志上下文；
+    请求结束后通过 app.access 日志器输出一行 JSON，包含路由 ID（由 route_id 生成）、
+    状态码、耗时、数据库耗时和语句数以及响应大小。5xx 响应总是记录，其余按采样率记录。
+    同一语句重复执行过多（疑似 N+1）时记录警告；开启 DB_QUERY_HEADERS 时
+    在响应头中返回语句数和数据库耗时。
+    """
+
+    def __init__(self, app: ASGIApp, *, route_id: Callable[[APIRoute], str]):
+        self.app = app
+        self.route_id = route_id
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _incoming_request_id(scope) or uuid.uuid4().hex
+        stats = RequestStats()
+        id_token = request_id_var.set(request_id)
+        stats_token = request_stats_var.set(stats)
+        scope_token = request_scope_var.set(scope)
+        status = 500
+        response_bytes = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    *message.get("headers", ()),
+                    (_REQUEST_ID_HEADER_KEY, request_id.encode()),
+                ]
+                if settings.DB_QUERY_HEADERS:
+                    # 响应开始前的语句（后台任务中的不计入）
+                    headers.append((_DB_QUERIES_HEADER_KEY, b"%d" % stats.db_queries))
+                    headers.append(
+                        (_DB_TIME_HEADER_KEY, b"%.3f" % (stats.db_seconds * 1000))
+                    )
+                message["headers"] = headers
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            request_id_var.reset(id_token)
+            request_stats_var.reset(stats_token)
+            request_scope_var.reset(scope_token)
+            route_id = _route_id(scope, self.route_id)
+            _warn_repeated_statements(stats, scope["method"], scope["path"], route_id)
+            if status >= 500 or random.random() < _sample_rate(route_id):
+                access_logger.info(
+                    dumps(
+                        {
+                            "ts": time.time(),
+                            "request_id": request_id,
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "route": route_id,
+                            "status": status,
+                            "duration_ms": round(duration * 1000, 3),
+                            "db_ms": round(stats.db_seconds * 1000, 3),
+                            "db_queries": stats.db_queries,
+                            "response_bytes": response_bytes,
+                        }
+                    )
+                )
+
+
+def _read_primary_cookie() -> bytes:
+    response = Response()
+    response.set_cookie(
+        READ_PRIMARY_COOKIE,
+        "1",
+        max_age=settings.READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+    )
+    return response.headers["set-cookie"].encode("latin-1")
+
+
+class ReadYourWritesMiddleware:
+    """
+    read-your-writes cookie
+
+    写请求中 get_db 在 request.state 上做标记（配置了只读副本时），响应开始时据此
+    设置 read_primary cookie，此后一段时间内该客户端的读请求走主库。
+    在中间件中设置，处理函数直接返回的 Response 同样带上 cookie。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        # 与处理函数中的 request.state 共用同一个字典
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.get(
+                READ_PRIMARY_STATE
+            ):
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"set-cookie", _read_primary_cookie()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class MetricsMiddleware:
+    """
+    HTTP 指标
+
+    按路由 ID、方法和状态码记录请求耗时，未匹配的请求归入 "unmatched"，
+    避免按原始路径打标签导致时间序列数量失控。同时在每个请求开始时采样
+    anyio 线程池（同步处理函数所用）的占用情况。
+    """
+
+    def __init__(self, app: ASGIApp, *, route_id: Callable[[APIRoute], str]):
+        self.app = app
+        self.route_id = route_id
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _sample_threadpool()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(
+                _route_id(scope, self.route_id) or "unmatched",
+                scope["method"],
+                str(status),
+            ).observe(time.perf_counter() - start)
+
+
+def _sample_threadpool() -> None:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+class TracingMiddleware:
+    """
+    请求追踪
+
+    为每个请求开始根 span（沿用上游 traceparent 的 trace ID 和采样标记），
+    结束时以路由模板命名并记录状态码；采样的请求在响应头中返回 traceparent。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with start_trace(
+            f"{scope['method']} {scope['path']}",
+            traceparent=Headers(scope=scope).get(TRACEPARENT_HEADER),
+            attributes={
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+                "request_id": request_id_var.get(),
+            },
+        ) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        root.error = f"HTTP {message['status']}"
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (TRACEPARENT_HEADER.encode(), root.traceparent.encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    root.name = f"{scope['method']} {route}"
+                    root.set_attribute("http.route", route)
+
+
+PROFILE_HEADER = "X-Profile"
+_PROFILE_QUERY_PARAM = "_profile"
+_PROFILE_MODES = ("return", "save")
+
+
+def _profile_mode(scope: Scope) -> str | None:
+    mode = Headers(scope=scope).get(PROFILE_HEADER)
+    if mode is None and _PROFILE_QUERY_PARAM.encode() in scope["query_string"]:
+        values = parse_qs(scope["query_string"].decode()).get(_PROFILE_QUERY_PARAM)
+        mode = values[0] if values else None
+    return mode if mode in _PROFILE_MODES else None
+
+
+def _is_superuser(scope: Scope) -> bool:
+    scheme, token = get_authorization_scheme_param(
+        Headers(scope=scope).get("Authorization")
+    )
+    if scheme.lower() != "bearer":
+        return False
+    with ReadOnlySession(read_only_engine, expire_on_commit=False) as session:
+        try:
+            get_current_active_superuser(get_current_principal(session, token))
+        except HTTPException:
+            return False
+    return True
+
+
+class ProfilingMiddleware:
+    """
+    超级用户按需分析请求
+
+    请求带 X-Profile: return|save 头（或 _profile= 查询参数）且令牌属于超级用户时，
+    用 cProfile 分析该请求（同步处理函数需先经过 profile_sync_endpoints 包装）：
+    return 用 pstats 文件替换响应体，原状态码放在 X-Profile-Status 头中；
+    save 正常返回响应，pstats 文件保存到 profile_dir（最多保留 max_files 个），
+    文件名放在 X-Profile-File 头中。同一进程同时只分析一个请求，其余照常处理。
+    """
+
+    def __init__(self, app: ASGIApp, *, profile_dir: Path, max_files: int):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+        self._busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (mode := _profile_mode(scope)) is None:
+            await self.app(scope, receive, send)
+            return
+        if self._busy:
+            await self.app(scope, receive, send)
+            return
+        # 在等待鉴权之前占用，避免两个请求同时通过检查
+        self._busy = True
+        try:
+            await self._profile(scope, receive, send, mode)
+        finally:
+            self._busy = False
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send, mode: str) -> None:
+        if not await run_in_threadpool(_is_superuser, scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession()
+        file_name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if mode == "return":
+                # 丢弃原响应，结束后再发送分析结果
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                return
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-profile-file", file_name.encode()),
+                ]
+            await send(message)
+
+        token = profile_session_var.set(session)
+        try:
+            with session.profile():
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            profile_session_var.reset(token)
+
+        data = await run_in_threadpool(session.dump)
+        if mode == "save":
+            await run_in_threadpool(
+                save_profile,
+                self.profile_dir,
+                file_name,
+                data,
+                max_files=self.max_files,
+            )
+            return
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/octet-stream"),
+                    (b"content-length", str(len(data)).encode()),
+                    (
+                        b"content-disposition",
+                        f'attachment; filename="{file_name}"'.encode(),
+                    ),
+                    (b"x-profile-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+
+# 已压缩的内容类型，再压缩只浪费 CPU
+_UNCOMPRESSIBLE_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+)
+# 超过该大小的数据块放到线程池中压缩，避免阻塞事件循环
+_COMPRESS_IN_THREAD_SIZE = 64 * 1024
+
+
+def _compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", "").lower():
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return content_type.startswith("image/svg+xml") or not content_type.startswith(
+        _UNCOMPRESSIBLE_TYPES
+    )
+
+
+def _compress_all(compressor: Compressor, data: bytes) -> bytes:
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    响应压缩
+
+    按 Accept-Encoding 协商 zstd / br / gzip（见 app.core.compression），levels 为各编码的
+    压缩级别。小于 minimum_size 字节的响应、已有 Content-Encoding 的响应、图片/音视频/
+    压缩包等已压缩的内容以及带 Cache-Control: no-transform 的响应原样返回。
+    分多块发送的响应（StreamingResponse 等）逐块压缩后立即发送，不缓存整个响应体。
+    压缩后的表示与原响应字节不同，强 ETag 改为弱 ETag。
+    """
+
+    def __init__(self, app: ASGIApp, *, minimum_size: int, levels: dict[str, int]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = levels
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), list(ENCODINGS)
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        compressor: Compressor | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # 等到第一块响应体再决定是否压缩
+                start_message = message
+                return
+            if (
+                passthrough
+                or start_message is None
+                or message["type"] != "http.response.body"
+            ):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                chunk = await self._compress(compressor.compress, body)
+                if not more_body:
+                    chunk += compressor.finish()
+                if chunk or not more_body:
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": more_body,
+                        }
+                    )
+                return
+
+            headers = MutableHeaders(raw=list(start_message.get("headers", ())))
+            if more_body:
+                declared = headers.get("content-length")
+                too_small = declared is not None and int(declared) < self.minimum_size
+            else:
+                too_small = len(body) < self.minimum_size
+            if too_small or not _compressible(start_message["status"], headers):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressor = ENCODINGS[encoding](self.levels[encoding])
+            headers["content-encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag is not None and etag.startswith('"'):
+                headers["etag"] = f"W/{etag}"
+            if more_body:
+                if "content-length" in headers:
+                    del headers["content-length"]
+                chunk = await self._compress(compressor.compress, body)
+            else:
+                chunk = await self._compress(
+                    functools.partial(_compress_all, compressor), body
+                )
+                headers["content-length"] = str(len(chunk))
+            start_message["headers"] = headers.raw
+            await send(start_message)
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def _compress(fn: Callable[[bytes], bytes], data: bytes) -> bytes:
+        if len(data) >= _COMPRESS_IN_THREAD_SIZE:
+            return await run_in_threadpool(fn, data)
+        return fn(data)
@@ -1,13 +1,42 @@
 """
 统一 API 响应工具函数
+
+success / paged_response 返回的 ApiResponse 会再由 FastAPI 按 response_model
+校验一遍并经 jsonable_encoder 编码。读接口可改用 serialized_success /
+serialized_paged_response：用预先构建的 TypeAdapter 从 ORM 对象校验一次，
+直接序列化为 JSON 字节并返回 Response，FastAPI 不再处理返回值；
+路由上的 response_model 保持不变，OpenAPI 文档和响应结构与原来一致。
+
+MessagePack：请求头 Accept 中 application/msgpack 的权重不低于
+JSON 时，serialized_* 返回 msgpack 编码的同一响应结构，UUID 编码为 16 字节的 bin；
+使用 MsgpackRoute 的路由还接受 Content-Type: application/msgpack 的请求体，
+解码后按与 JSON 相同的规则校验。默认仍为 JSON，错误响应总是 JSON。
+
+条件请求：ETag 由行版本号（以及字段集、响应格式）生成，见 row_etag。
 """
 
-from typing import TypeVar
+import functools
+import hashlib
+import uuid
+from collections.abc import Callable, Coroutine
+from typing import Any, Generic, TypeVar
+
+import msgpack  # type: ignore[import-untyped]
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from pydantic_core import to_jsonable_python
+from starlette.datastructures import Headers
 
+from app.core.request_context import request_scope_var
 from app.models import ApiResponse, PagedData
 
 T = TypeVar("T")
 
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = frozenset({MSGPACK_MEDIA_TYPE, "application/x-msgpack"})
+_JSON_MEDIA_RANGES = frozenset({"application/json", "application/*", "*/*"})
+
 
 def success(data: T | None = None, message: str = "success") -> ApiResponse[T]:
     """
@@ -69,3 +98,291 @@ def paged_response(
             pages=pages,
         ),
     )
+
+
+class _PagedData(BaseModel, Generic[T]):
+    items: list[T]
+    total: int
+    page: int
+    page_size: int
+    pages: int
+
+
+class _ApiResponse(BaseModel, Generic[T]):
+    # 与 ApiResponse 字段相同。SQLModel 的泛型模型参数化后字段类型仍是 T，
+    # 不会按 data 的公开模型校验和过滤字段，这里用 pydantic 的泛型模型
+    code: int
+    message: str
+    data: T | None = None
+
+
+class SerializedResponse(Response):
+    """已序列化为 JSON（或 msgpack）字节的响应"""
+
+    media_type = "application/json"
+
+
+# ==================== 条件请求 ====================
+
+
+def row_etag(version: int, fields: tuple[str, ...] | None = None) -> str:
+    """
+    行版本号对应的 ETag
+
+    同一版本的不同表示（fields= 字段集、msgpack）字节不同，用后缀区分。
+    """
+    variant = ",".join(fields or ())
+    if _wants_msgpack():
+        variant += ";msgpack"
+    if not variant:
+        return f'"{version}"'
+    digest = hashlib.blake2s(variant.encode(), digest_size=4).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def _entity_tags(header: str) -> list[str]:
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 是否与 etag 匹配（弱比较）"""
+    if not if_none_match:
+        return False
+    tags = _entity_tags(if_none_match)
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def if_match_versions(if_match: str | None) -> list[int] | None:
+    """
+    If-Match 中的行版本号
+
+    未传或为 "*" 时返回 None（不限制版本）；无法识别的 ETag 被忽略，
+    全部无法识别时返回空列表（任何版本都不匹配）。ETag 只由行版本号决定，
+    压缩中间件改成的弱 ETag 表示同一版本，因此同样接受。
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in _entity_tags(if_match):
+        version, _, _ = tag.strip('"').partition("-")
+        if version.isdigit():
+            versions.append(int(version))
+    return versions
+
+
+def not_modified(etag: str, if_none_match: str) -> Response:
+    """
+    304 Not Modified，与 200 响应携带相同的 Vary
+
+    压缩后的 200 响应带弱 ETag（见 CompressionMiddleware），客户端持有弱 ETag 时
+    304 同样返回弱 ETag，与客户端缓存的表示一致。
+    """
+    held = [tag.strip() for tag in if_none_match.split(",")]
+    if etag not in held and f"W/{etag}" in held:
+        etag = f"W/{etag}"
+    return Response(
+        status_code=304, headers={"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    )
+
+
+# ==================== MessagePack ====================
+
+
+def _quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.strip().partition("=")
+        if name == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_msgpack(accept: str) -> bool:
+    """Accept 中 msgpack 的权重不低于 JSON 时返回 True"""
+    if "msgpack" not in accept:
+        return False
+    msgpack_q = json_q = 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        if media_type in _MSGPACK_MEDIA_TYPES:
+            msgpack_q = max(msgpack_q, _quality(params))
+        elif media_type in _JSON_MEDIA_RANGES:
+            json_q = max(json_q, _quality(params))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def _wants_msgpack() -> bool:
+    scope = request_scope_var.get()
+    return scope is not None and accepts_msgpack(Headers(scope=scope).get("accept", ""))
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, uuid.UUID):
+        return obj.bytes
+    # 其余类型（datetime 等）与 JSON 输出一致
+    return to_jsonable_python(obj)
+
+
+def msgpack_dumps(data: Any) -> bytes:
+    return msgpack.packb(data, default=_msgpack_default)  # type: ignore[no-any-return]
+
+
+def _decode_uuids(data: Any) -> Any:
+    # JSON 请求体中没有二进制字段，16 字节的 bin 只可能是 UUID
+    if isinstance(data, dict):
+        return {key: _decode_uuids(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_decode_uuids(value) for value in data]
+    if isinstance(data, bytes) and len(data) == 16:
+        return uuid.UUID(bytes=data)
+    return data
+
+
+def msgpack_loads(data: bytes) -> Any:
+    return _decode_uuids(msgpack.unpackb(data))
+
+
+class MsgpackRequest(Request):
+    """请求体为 msgpack 的请求，json() 返回解码后的数据"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = msgpack_loads(await self.body())
+        return self._json
+
+
+def _is_msgpack_body(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    return content_type.partition(";")[0].strip().lower() in _MSGPACK_MEDIA_TYPES
+
+
+class MsgpackRoute(APIRoute):
+    """
+    接受 msgpack 请求体的路由
+
+    把 Content-Type 改写为 JSON 后交给 FastAPI 按同样的规则解析和校验，
+    请求体由 MsgpackRequest.json() 解码。
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if _is_msgpack_body(request):
+                headers = [
+                    (key, value)
+                    for key, value in request.scope["headers"]
+                    if key != b"content-type"
+                ]
+                headers.append((b"content-type", b"application/json"))
+                request = MsgpackRequest(
+                    {**request.scope, "headers": headers}, request.receive
+                )
+            return await handler(request)
+
+        return route_handler
+
+
+@functools.cache
+def response_adapter(data_type: Any) -> TypeAdapter[Any]:
+    """ApiResponse[data_type] 的 TypeAdapter，每种类型只构建一次"""
+    return TypeAdapter(_ApiResponse[data_type])
+
+
+@functools.cache
+def partial_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """只包含 fields 的公开模型（fields= 稀疏字段集），每种组合只构建一次"""
+    return create_model(  # type: ignore[call-overload, no-any-return]
+        f"{model.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (model.model_fields[name].annotation, model.model_fields[name])
+            for name in fields
+        },
+    )
+
+
+def _serialize(data_type: Any, content: dict[str, Any]) -> SerializedResponse:
+    adapter = response_adapter(data_type)
+    # from_attributes：直接从 ORM 对象读取公开模型声明的字段
+    envelope = adapter.validate_python(content, from_attributes=True)
+    # 响应格式按 Accept 协商，缓存需要区分
+    headers = {"Vary": "Accept"}
+    if _wants_msgpack():
+        return SerializedResponse(
+            content=msgpack_dumps(adapter.dump_python(envelope)),
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers=headers,
+        )
+    return SerializedResponse(content=adapter.dump_json(envelope), headers=headers)
+
+
+def serialized_success(
+    data_type: Any,
+    data: Any = None,
+    message: str = "success",
+    *,
+    fields: tuple[str, ...] | None = None,
+) -> SerializedResponse:
+    """
+    创建已序列化的成功响应
+
+    Args:
+        data_type: data 的公开类型，与 response_model=ApiResponse[data_type] 一致
+        data: 响应数据（可以是 ORM 对象或查询结果行）
+        message: 响应消息
+        fields: 只输出 data 的这些字段
+
+    Returns:
+        JSON 响应
+    """
+    if fields:
+        data_type = partial_model(data_type, fields)
+    return _serialize(data_type, {"code": 200, "message": message, "data": data})
+
+
+def serialized_paged_response(
+    item_type: Any,
+    items: list[Any],
+    total: int,
+    page: int = 1,
+    page_size: int = 20,
+    message: str = "success",
+    *,
+    fields: tuple[str, ...] | None = None,
+) -> SerializedResponse:
+    """
+    创建已序列化的分页响应
+
+    Args:
+        item_type: 列表元素的公开类型，与 response_model=ApiResponse[PagedData[item_type]] 一致
+        items: 当前页数据列表（可以是 ORM 对象或查询结果行）
+        total: 总记录数
+        page: 当前页码
+        page_size: 每页数量
+        message: 响应消息
+        fields: 只输出列表元素的这些字段
+
+    Returns:
+        JSON 响应
+    """
+    if fields:
+        item_type = partial_model(item_type, fields)
+    pages = (total + page_size - 1) // page_size if page_size > 0 else 0
+    return _serialize(
+        _PagedData[item_type],
+        {
+            "code": 200,
+            "message": message,
+            "data": {
+                "items": items,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "pages": pages,
+            },
+        },
+    )
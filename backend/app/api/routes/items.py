@@ -1,113 +1,232 @@
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, Header, HTTPException
 
-from app.api.deps import CurrentUser, SessionDep
-from app.api.response import paged_response, success
+from app.api.deps import CurrentPrincipal, ItemFieldsDep, ReadSessionDep, SessionDep
+from app.api.response import (
+    MsgpackRoute,
+    etag_matches,
+    if_match_versions,
+    not_modified,
+    row_etag,
+    serialized_paged_response,
+    serialized_success,
+    success,
+)
 from app.models import (
     ApiResponse,
     Item,
+    ItemBulkResult,
     ItemCreate,
     ItemPublic,
+    ItemsBulkCreate,
+    ItemsBulkDelete,
+    ItemsBulkUpdate,
     ItemUpdate,
     PagedData,
 )
+from app.repositories import item_repository
 
-router = APIRouter(prefix="/items", tags=["items"])
+router = APIRouter(prefix="/items", tags=["items"], route_class=MsgpackRoute)
 
 
 @router.get("/", response_model=ApiResponse[PagedData[ItemPublic]])
 def read_items(
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: ReadSessionDep,
+    current_user: CurrentPrincipal,
+    fields: ItemFieldsDep,
     page: int = 1,
     page_size: int = 20,
 ) -> Any:
     """
     获取 Item 列表（分页）
-    """
-    # 计算偏移量
-    skip = (page - 1) * page_size
 
+    指定 fields 时只查询和返回这些字段
+    """
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        total = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(page_size)
-        items = session.exec(statement).all()
+        items, total = item_repository.get_multi(
+            session, page=page, page_size=page_size, fields=fields
+        )
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
+        items, total = item_repository.get_multi_by_owner(
+            session,
+            owner_id=current_user.id,
+            page=page,
+            page_size=page_size,
+            fields=fields,
+        )
+
+    return serialized_paged_response(
+        ItemPublic, items, total=total, page=page, page_size=page_size, fields=fields
+    )
+
+
+def _bulk_failures(
+    session: SessionDep, ids: list[uuid.UUID]
+) -> list[ItemBulkResult]:
+    """为未被处理的行生成失败结果：不存在，或不属于当前用户"""
+    existing = item_repository.get_existing_ids(session, ids=ids)
+    return [
+        ItemBulkResult(
+            id=item_id,
+            success=False,
+            message="Not enough permissions" if item_id in existing else "Item not found",
         )
-        total = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(page_size)
+        for item_id in ids
+    ]
+
+
+@router.post("/bulk", response_model=ApiResponse[list[ItemBulkResult]])
+def create_items_bulk(
+    *, session: SessionDep, current_user: CurrentPrincipal, body: ItemsBulkCreate
+) -> Any:
+    """
+    批量创建 Item
+    """
+    items = item_repository.bulk_create_with_owner(
+        session, objs_in=body.items, owner_id=current_user.id
+    )
+    return success(
+        data=[
+            ItemBulkResult(id=item.id, success=True, data=ItemPublic.model_validate(item))
+            for item in items
+        ]
+    )
+
+
+@router.patch("/bulk", response_model=ApiResponse[list[ItemBulkResult]])
+def update_items_bulk(
+    *, session: SessionDep, current_user: CurrentPrincipal, body: ItemsBulkUpdate
+) -> Any:
+    """
+    批量更新 Item
+
+    按请求顺序返回每一行的处理结果
+    """
+    items = item_repository.bulk_update(
+        session,
+        objs_in=body.items,
+        owner_id=None if current_user.is_superuser else current_user.id,
+    )
+    results = {
+        item.id: ItemBulkResult(
+            id=item.id, success=True, data=ItemPublic.model_validate(item)
         )
-        items = session.exec(statement).all()
+        for item in items
+    }
+    missing = [obj_in.id for obj_in in body.items if obj_in.id not in results]
+    results.update((r.id, r) for r in _bulk_failures(session, missing))
+    return success(data=[results[obj_in.id] for obj_in in body.items])
 
-    return paged_response(items=list(items), total=total, page=page, page_size=page_size)
+
+@router.delete("/bulk", response_model=ApiResponse[list[ItemBulkResult]])
+def delete_items_bulk(
+    *, session: SessionDep, current_user: CurrentPrincipal, body: ItemsBulkDelete
+) -> Any:
+    """
+    批量删除 Item
+
+    按请求顺序返回每一行的处理结果
+    """
+    deleted = item_repository.bulk_delete(
+        session,
+        ids=body.ids,
+        owner_id=None if current_user.is_superuser else current_user.id,
+    )
+    results = {
+        item_id: ItemBulkResult(id=item_id, success=True) for item_id in deleted
+    }
+    missing = [item_id for item_id in body.ids if item_id not in results]
+    results.update((r.id, r) for r in _bulk_failures(session, missing))
+    return success(data=[results[item_id] for item_id in body.ids])
 
 
 @router.get("/{id}", response_model=ApiResponse[ItemPublic])
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_item(
+    session: ReadSessionDep,
+    current_user: CurrentPrincipal,
+    id: uuid.UUID,
+    fields: ItemFieldsDep,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Any:
     """
     根据 ID 获取 Item
+
+    指定 fields 时只查询和返回这些字段（权限检查用到的 owner_id 总是查询）。
+    If-None-Match 与当前版本的 ETag 匹配时只查询版本号，返回 304。
     """
-    item = session.get(Item, id)
+    if if_none_match:
+        current = item_repository.get_fields(session, id, fields=("owner_id", "version"))
+        if current and (current_user.is_superuser or current.owner_id == current_user.id):
+            etag = row_etag(current.version, fields)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, if_none_match)
+
+    if fields:
+        columns = tuple(dict.fromkeys((*fields, "owner_id", "version")))
+        item = item_repository.get_fields(session, id, fields=columns)
+    else:
+        item = session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return success(data=item)
+    response = serialized_success(ItemPublic, item, fields=fields)
+    response.headers["ETag"] = row_etag(item.version, fields)
+    return response
 
 
 @router.post("/", response_model=ApiResponse[ItemPublic])
 def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+    *, session: SessionDep, current_user: CurrentPrincipal, item_in: ItemCreate
 ) -> Any:
     """
     创建新 Item
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
-    return success(data=item)
+    item = item_repository.create_with_owner(
+        session, obj_in=item_in, owner_id=current_user.id
+    )
+    return serialized_success(ItemPublic, item)
 
 
 @router.put("/{id}", response_model=ApiResponse[ItemPublic])
 def update_item(
     *,
     session: SessionDep,
-    current_user: CurrentUser,
+    current_user: CurrentPrincipal,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     更新 Item
+
+    带 If-Match 时只有当前版本与之匹配才更新（乐观并发控制），否则返回 412
     """
-    item = session.get(Item, id)
+    item = item_repository.update_owned(
+        session,
+        id=id,
+        obj_in=item_in,
+        owner_id=None if current_user.is_superuser else current_user.id,
+        versions=if_match_versions(if_match),
+    )
     if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    update_dict = item_in.model_dump(exclude_unset=True)
-    item.sqlmodel_update(update_dict)
-    session.add(item)
-    session.commit()
-    session.refresh(item)
-    return success(data=item)
+        # 没有行被更新：区分不存在、无权限和版本不匹配
+        current = session.get(Item, id)
+        if not current:
+            raise HTTPException(status_code=404, detail="Item not found")
+        if not current_user.is_superuser and current.owner_id != current_user.id:
+            raise HTTPException(status_code=400, detail="Not enough permissions")
+        raise HTTPException(status_code=412, detail="Item has been modified")
+    response = serialized_success(ItemPublic, item)
+    response.headers["ETag"] = row_etag(item.version)
+    return response
 
 
 @router.delete("/{id}", response_model=ApiResponse[None])
 def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+    session: SessionDep, current_user: CurrentPrincipal, id: uuid.UUID
 ) -> Any:
     """
     删除 Item
@@ -118,5 +237,4 @@ def delete_item(
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     session.delete(item)
-    session.commit()
     return success(message="Item deleted successfully")
@@ -4,17 +4,25 @@
 from datetime import timedelta
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
-from app.api.response import success
+from app.api.deps import (
+    CurrentUser,
+    ReadSessionDep,
+    SessionDep,
+    get_current_active_superuser,
+    limit_login_concurrency,
+)
+from app.api.response import serialized_success, success
 from app.core import security
+from app.core.auth_cache import invalidate_user
 from app.core.config import settings
 from app.core.security import get_password_hash
-from app.models import ApiResponse, NewPassword, Token, UserPublic
+from app.models import ApiResponse, AuthUser, NewPassword, Token, UserPublic
 from app.repositories import user_repository
+from app.services import user_service
 from app.utils import (
     generate_password_reset_token,
     generate_reset_password_email,
@@ -25,12 +33,20 @@ from app.utils import (
 router = APIRouter(tags=["login"])
 
 
-@router.post("/login/access-token", response_model=ApiResponse[Token])
+@router.post(
+    "/login/access-token",
+    dependencies=[Depends(limit_login_concurrency)],
+    response_model=ApiResponse[Token],
+)
 def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+    session: ReadSessionDep,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    background_tasks: BackgroundTasks,
 ) -> Any:
     """
     OAuth2 兼容的 token 登录，获取访问令牌
+
+    密码哈希的方案或成本已过期时，在响应发送后按当前配置重新哈希
     """
     user = user_repository.authenticate(
         session, email=form_data.username, password=form_data.password
@@ -39,10 +55,21 @@ def login_access_token(
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    if security.password_needs_update(user.hashed_password):
+        background_tasks.add_task(
+            user_service.upgrade_password_hash,
+            user_id=user.id,
+            hashed_password=user.hashed_password,
+            password=form_data.password,
+        )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = None
+    if settings.ACCESS_TOKEN_EMBED_CLAIMS:
+        claims = AuthUser.model_validate(user).model_dump(exclude={"id"})
+        claims["ver"] = user.token_version
     token = Token(
         access_token=security.create_access_token(
-            user.id, expires_delta=access_token_expires
+            user.id, expires_delta=access_token_expires, claims=claims
         )
     )
     return success(data=token)
@@ -53,7 +80,7 @@ def test_token(current_user: CurrentUser) -> Any:
     """
     测试访问令牌
     """
-    return success(data=current_user)
+    return serialized_success(UserPublic, current_user)
 
 
 @router.post("/password-recovery/{email}", response_model=ApiResponse[None])
@@ -73,6 +100,7 @@ def recover_password(email: str, session: SessionDep) -> Any:
         email_to=user.email, email=email, token=password_reset_token
     )
     send_email(
+        session,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
@@ -88,6 +116,8 @@ def reset_password(session: SessionDep, body: NewPassword) -> Any:
     email = verify_password_reset_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
+    # 先在事务外完成耗时的哈希计算，缩短连接占用时间
+    hashed_password = get_password_hash(password=body.new_password)
     user = user_repository.get_by_email(session, email=email)
     if not user:
         raise HTTPException(
@@ -96,10 +126,9 @@ def reset_password(session: SessionDep, body: NewPassword) -> Any:
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(password=body.new_password)
     user.hashed_password = hashed_password
     session.add(user)
-    session.commit()
+    invalidate_user(session, user.id)
     return success(message="Password updated successfully")
 
 
@@ -7,7 +7,7 @@ from typing import Any
 
 from fastapi import APIRouter, HTTPException, UploadFile
 
-from app.api.response import success
+from app.api.response import serialized_success
 from app.models import ApiResponse
 from app.schemas.ocr import OcrSimResult
 from app.services.ocr import ocr_service
@@ -48,4 +48,4 @@ async def recognize_image(file: UploadFile) -> Any:
     # 调用 OCR 服务
     ocr_result = ocr_service.get_sim(content)
 
-    return success(data=ocr_result)
+    return serialized_success(OcrSimResult, ocr_result)
@@ -4,7 +4,7 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 
 from app.api.deps import SessionDep
-from app.api.response import success
+from app.api.response import serialized_success
 from app.core.security import get_password_hash
 from app.models import (
     ApiResponse,
@@ -34,8 +34,7 @@ def create_user(user_in: PrivateUserCreate, session: SessionDep) -> Any:
     )
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    session.flush()
 
-    return success(data=user)
+    return serialized_success(UserPublic, user)
 
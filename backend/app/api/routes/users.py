@@ -2,22 +2,33 @@
 用户相关路由
 """
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import APIRouter, Depends, Header, HTTPException
 
 from app.api.deps import (
+    CurrentPrincipal,
     CurrentUser,
+    PrimaryReadSessionDep,
+    ReadSessionDep,
     SessionDep,
+    UserFieldsDep,
     get_current_active_superuser,
+    get_current_user,
+)
+from app.api.response import (
+    MsgpackRoute,
+    etag_matches,
+    not_modified,
+    row_etag,
+    serialized_paged_response,
+    serialized_success,
+    success,
 )
-from app.api.response import paged_response, success
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import verify_password
 from app.models import (
     ApiResponse,
-    Item,
     PagedData,
     UpdatePassword,
     User,
@@ -30,7 +41,7 @@ from app.models import (
 from app.repositories import user_repository
 from app.utils import generate_new_account_email, send_email
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=MsgpackRoute)
 
 
 @router.get(
@@ -38,12 +49,20 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=ApiResponse[PagedData[UserPublic]],
 )
-def read_users(session: SessionDep, page: int = 1, page_size: int = 20) -> Any:
+def read_users(
+    session: ReadSessionDep, fields: UserFieldsDep, page: int = 1, page_size: int = 20
+) -> Any:
     """
     获取用户列表（分页）
+
+    指定 fields 时只查询和返回这些字段
     """
-    users, total = user_repository.get_multi(session, page=page, page_size=page_size)
-    return paged_response(items=list(users), total=total, page=page, page_size=page_size)
+    users, total = user_repository.get_multi(
+        session, page=page, page_size=page_size, fields=fields
+    )
+    return serialized_paged_response(
+        UserPublic, users, total=total, page=page, page_size=page_size, fields=fields
+    )
 
 
 @router.post(
@@ -67,12 +86,14 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
+        # 与用户在同一事务中写入发件箱，用户创建失败时不会发出邮件
         send_email(
+            session,
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
         )
-    return success(data=user)
+    return serialized_success(UserPublic, user)
 
 
 @router.patch("/me", response_model=ApiResponse[UserPublic])
@@ -89,11 +110,10 @@ def update_user_me(
                 status_code=409, detail="User with this email already exists"
             )
     user_data = user_in.model_dump(exclude_unset=True)
-    current_user.sqlmodel_update(user_data)
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return success(data=current_user)
+    user = user_repository.update(
+        session, db_obj=current_user, obj_in=UserUpdate.model_validate(user_data)
+    )
+    return serialized_success(UserPublic, user)
 
 
 @router.patch("/me/password", response_model=ApiResponse[None])
@@ -109,23 +129,40 @@ def update_password_me(
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
-    current_user.hashed_password = hashed_password
-    session.add(current_user)
-    session.commit()
+    user_repository.update(
+        session,
+        db_obj=current_user,
+        obj_in=UserUpdate(password=body.new_password),
+    )
     return success(message="Password updated successfully")
 
 
 @router.get("/me", response_model=ApiResponse[UserPublic])
-def read_user_me(current_user: CurrentUser) -> Any:
+def read_user_me(
+    session: PrimaryReadSessionDep,
+    current_user: CurrentPrincipal,
+    fields: UserFieldsDep,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Any:
     """
     获取当前用户信息
+
+    If-None-Match 与当前版本的 ETag 匹配时只查询版本号，返回 304
     """
-    return success(data=current_user)
+    if if_none_match:
+        current = user_repository.get_fields(session, current_user.id, fields=("version",))
+        if current:
+            etag = row_etag(current.version, fields)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, if_none_match)
+    user = get_current_user(session, current_user)
+    response = serialized_success(UserPublic, user, fields=fields)
+    response.headers["ETag"] = row_etag(user.version, fields)
+    return response
 
 
 @router.delete("/me", response_model=ApiResponse[None])
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+def delete_user_me(session: SessionDep, current_user: CurrentPrincipal) -> Any:
     """
     删除当前用户
     """
@@ -133,11 +170,20 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    session.delete(current_user)
-    session.commit()
+    # item 由外键 ON DELETE CASCADE 删除，无需加载 current_user.items
+    user_repository.delete(session, id=current_user.id)
     return success(message="User deleted successfully")
 
 
+@router.post("/me/revoke-tokens", response_model=ApiResponse[None])
+def revoke_tokens_me(session: SessionDep, current_user: CurrentPrincipal) -> Any:
+    """
+    使当前用户已签发的自包含令牌全部失效
+    """
+    user_repository.revoke_tokens(session, id=current_user.id)
+    return success(message="Tokens revoked successfully")
+
+
 @router.post("/signup", response_model=ApiResponse[UserPublic])
 def register_user(session: SessionDep, user_in: UserRegister) -> Any:
     """
@@ -151,25 +197,43 @@ def register_user(session: SessionDep, user_in: UserRegister) -> Any:
         )
     user_create = UserCreate.model_validate(user_in)
     user = user_repository.create(session, obj_in=user_create)
-    return success(data=user)
+    return serialized_success(UserPublic, user)
 
 
 @router.get("/{user_id}", response_model=ApiResponse[UserPublic])
 def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+    user_id: uuid.UUID,
+    session: ReadSessionDep,
+    current_user: CurrentPrincipal,
+    fields: UserFieldsDep,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     根据 ID 获取用户
+
+    指定 fields 时只查询和返回这些字段；
+    If-None-Match 与当前版本的 ETag 匹配时只查询版本号，返回 304
     """
-    user = user_repository.get(session, user_id)
-    if user == current_user:
-        return success(data=user)
-    if not current_user.is_superuser:
+    if user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="The user doesn't have enough privileges",
         )
-    return success(data=user)
+    if if_none_match:
+        current = user_repository.get_fields(session, user_id, fields=("version",))
+        if current:
+            etag = row_etag(current.version, fields)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, if_none_match)
+    if fields:
+        columns = tuple(dict.fromkeys((*fields, "id", "version")))
+        user = user_repository.get_fields(session, user_id, fields=columns)
+    else:
+        user = user_repository.get(session, user_id)
+    response = serialized_success(UserPublic, user, fields=fields)
+    if user:
+        response.headers["ETag"] = row_etag(user.version, fields)
+    return response
 
 
 @router.patch(
@@ -200,7 +264,21 @@ def update_user(
             )
 
     db_user = user_repository.update(session, db_obj=db_user, obj_in=user_in)
-    return success(data=db_user)
+    return serialized_success(UserPublic, db_user)
+
+
+@router.post(
+    "/{user_id}/revoke-tokens",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=ApiResponse[None],
+)
+def revoke_tokens(session: SessionDep, user_id: uuid.UUID) -> Any:
+    """
+    使指定用户已签发的自包含令牌全部失效
+    """
+    if not user_repository.revoke_tokens(session, id=user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return success(message="Tokens revoked successfully")
 
 
 @router.delete(
@@ -209,7 +287,7 @@ def update_user(
     response_model=ApiResponse[None],
 )
 def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+    session: SessionDep, current_user: CurrentPrincipal, user_id: uuid.UUID
 ) -> Any:
     """
     删除用户
@@ -217,12 +295,10 @@ def delete_user(
     user = user_repository.get(session, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user:
+    if user.id == current_user.id:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
+    # item 由外键 ON DELETE CASCADE 删除
+    user_repository.delete(session, id=user_id)
     return success(message="User deleted successfully")
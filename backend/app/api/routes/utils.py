@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
-from app.api.deps import get_current_active_superuser
+from app.api.deps import SessionDep, get_current_active_superuser
 from app.api.response import success
 from app.models import ApiResponse
 from app.utils import generate_test_email, send_email
@@ -15,12 +15,13 @@ router = APIRouter(prefix="/utils", tags=["utils"])
     status_code=201,
     response_model=ApiResponse[None],
 )
-def test_email(email_to: EmailStr) -> ApiResponse[None]:
+def test_email(session: SessionDep, email_to: EmailStr) -> ApiResponse[None]:
     """
     测试邮件发送
     """
     email_data = generate_test_email(email_to=email_to)
     send_email(
+        session,
         email_to=email_to,
         subject=email_data.subject,
         html_content=email_data.html_content,
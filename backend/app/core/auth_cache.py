@@ -0,0 +1,114 @@
+"""
+鉴权用户缓存
+
+缓存 get_current_user 所需的用户字段，避免每个请求都按主键查询用户表；
+token_version_cache 是自包含令牌使用的版本表（用户 ID -> 当前令牌版本号）。
+用户信息变更或令牌被撤销时调用 invalidate_user，两个缓存一起失效：
+- 立即删除本进程的缓存，并在事务提交后再删除一次，防止提交前被并发请求回填旧数据
+- 配置了 AUTH_CACHE_INVALIDATION_CHANNEL 时，在同一事务中发送 NOTIFY，
+  提交后由各 worker 进程的 InvalidationListener 删除各自的缓存
+"""
+import logging
+import threading
+import uuid
+
+import psycopg
+from psycopg import sql
+from sqlalchemy import event, func, select
+from sqlmodel import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas.user import AuthUser
+
+logger = logging.getLogger(__name__)
+
+user_auth_cache: TTLCache[str, AuthUser] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAXSIZE,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    name="auth_user",
+)
+
+token_version_cache: TTLCache[str, int] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAXSIZE,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    name="token_version",
+)
+
+_PENDING_KEY = "invalidated_users"
+
+
+def _evict(key: str) -> None:
+    user_auth_cache.pop(key)
+    token_version_cache.pop(key)
+
+
+def _evict_all() -> None:
+    user_auth_cache.clear()
+    token_version_cache.clear()
+
+
+def invalidate_user(session: Session, user_id: uuid.UUID) -> None:
+    """使用户的鉴权缓存失效"""
+    key = str(user_id)
+    _evict(key)
+    session.info.setdefault(_PENDING_KEY, set()).add(key)
+    if settings.AUTH_CACHE_INVALIDATION_CHANNEL:
+        session.execute(
+            select(func.pg_notify(settings.AUTH_CACHE_INVALIDATION_CHANNEL, key))
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for key in session.info.pop(_PENDING_KEY, ()):
+        _evict(key)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, _previous_transaction: object) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+class InvalidationListener:
+    """
+    跨进程缓存失效监听器
+
+    在后台线程中 LISTEN 指定频道，收到的 payload 为用户 ID。
+    连接断开期间可能错过通知，重连后清空整个缓存。
+    """
+
+    def __init__(self, conninfo: str, channel: str, *, reconnect_seconds: float = 5):
+        self.conninfo = conninfo
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="auth-cache-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.reconnect_seconds)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+                    )
+                    _evict_all()
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            _evict(notify.payload)
+            except psycopg.Error:
+                logger.exception("Auth cache listener disconnected, retrying")
+                self._stop.wait(self.reconnect_seconds)
@@ -0,0 +1,89 @@
+"""
+进程内缓存
+
+提供线程安全的 TTL + LRU 缓存，用于鉴权等热点路径
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+from app.core.metrics import CACHE_ENTRIES, CACHE_LOOKUPS
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    带过期时间的 LRU 缓存
+
+    超过 maxsize 时淘汰最久未使用的条目；每个条目默认 ttl 秒后过期，
+    也可以在写入时指定更早的过期时间。
+    指定 name 时命中/未命中次数和条目数导出为 Prometheus 指标（cache 标签为 name）。
+    """
+
+    def __init__(self, *, maxsize: int, ttl: float, name: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            self._hit_counter = CACHE_LOOKUPS.labels(name, "hit")
+            self._miss_counter = CACHE_LOOKUPS.labels(name, "miss")
+            self._entries_gauge = CACHE_ENTRIES.labels(name)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        """获取未过期的条目，不存在或已过期时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                    self._update_size()
+                self.misses += 1
+                if self.name is not None:
+                    self._miss_counter.inc()
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self.name is not None:
+                self._hit_counter.inc()
+            return entry[1]
+
+    def set(self, key: K, value: V, *, ttl: float | None = None) -> None:
+        """写入条目，ttl 为空时使用默认过期时间"""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + min(self.ttl, self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._update_size()
+
+    def pop(self, key: K) -> V | None:
+        """删除条目"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            self._update_size()
+        return None if entry is None else entry[1]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._update_size()
+
+    def _update_size(self) -> None:
+        # 调用方持有 _lock
+        if self.name is not None:
+            self._entries_gauge.set(len(self._data))
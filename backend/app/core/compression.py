@@ -0,0 +1,103 @@
+"""
+响应压缩编码
+
+gzip 使用标准库，zstd 和 br 分别使用 zstandard 和 brotli。
+每个响应使用一个增量压缩器，逐块压缩，不需要缓存整个响应体。
+"""
+import zlib
+from collections.abc import Callable
+from typing import Protocol
+
+import brotli  # type: ignore[import-untyped]
+import zstandard
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """压缩一块数据，返回目前可输出的部分（可能为空）"""
+        ...
+
+    def finish(self) -> bytes:
+        """结束压缩流，返回剩余的输出"""
+        ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        # brotli 没有类型信息，标注返回值
+        output: bytes = self._obj.process(data)
+        return output
+
+    def finish(self) -> bytes:
+        output: bytes = self._obj.finish()
+        return output
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+# 按服务端偏好排序；客户端给出相同权重时选靠前的
+ENCODINGS: dict[str, Callable[[int], Compressor]] = {
+    "zstd": ZstdCompressor,
+    "br": BrotliCompressor,
+    "gzip": GzipCompressor,
+}
+
+
+def negotiate_encoding(
+    accept_encoding: str, available: list[str] | None = None
+) -> str | None:
+    """
+    根据 Accept-Encoding 选择编码
+
+    取客户端权重（q 值）最高的可用编码，权重相同时按服务端偏好；
+    "*" 匹配未单独列出的编码，q=0 表示拒绝。没有可用编码时返回 None。
+    """
+    available = list(ENCODINGS) if available is None else available
+    weights: dict[str, float] = {}
+    wildcard: float | None = None
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == "*":
+            wildcard = q
+        else:
+            weights[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
@@ -1,10 +1,193 @@
+import itertools
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine, Result, event
+from sqlalchemy.engine import Connection, ExceptionContext
+from sqlalchemy.orm import ORMExecuteState
+from sqlalchemy.pool import ConnectionPoolEntry, QueuePool
 from sqlmodel import Session, create_engine, select
 
 from app.core.config import settings
+from app.core.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_OVERFLOW,
+)
+from app.core.request_context import request_stats_var
+from app.core.slow_query import SlowQueryLog
+from app.core.tracing import install_sql_tracing
 from app.models import User, UserCreate
 from app.repositories import user_repository
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接耗时（排队等待和新建连接）的连接池，指标按 pool_logging_name 区分"""
+
+    # 日志器沿用 sqlalchemy.pool 命名空间，仍受 sqlalchemy 日志级别控制
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.QueuePool"
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.logging_name or "default").observe(
+                time.perf_counter() - start
+            )
+
+
+def _instrument_pool(engine: Engine) -> Engine:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return engine
+    name = pool.logging_name or "default"
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    overflow = DB_POOL_OVERFLOW.labels(name)
+
+    def update(*_args: Any) -> None:
+        checked_out.set(pool.checkedout())
+        overflow.set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", update)
+    event.listen(pool, "checkin", update)
+    return engine
+
+
+engine = _instrument_pool(
+    create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="primary",
+    )
+)
+# 与 engine 共用连接池，连接处于 autocommit 模式，供 ReadOnlySession 使用
+read_only_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+
+# 所有 engine（含只读副本）的语句耗时计入当前请求的统计
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn: Connection, *_args: Any) -> None:
+    if request_stats_var.get() is not None:
+        conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn: Connection, _cursor: Any, statement: str, *_args: Any
+) -> None:
+    start = conn.info.pop("query_start", None)
+    stats = request_stats_var.get()
+    if stats is None or start is None:
+        return
+    stats.db_queries += 1
+    stats.db_seconds += time.perf_counter() - start
+    stats.statements[statement] += 1
+
+
+# 慢查询日志（默认关闭），同样作用于所有 engine
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain_sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    explain_dir=Path(settings.LOG_DIR),
+    explain_timeout_ms=settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+)
+if settings.SLOW_QUERY_LOG_ENABLED:
+    slow_query_log.install()
+
+# 采样请求中的每条语句记录为 span
+if settings.TRACING_ENABLED:
+    install_sql_tracing()
+
+
+class ReadOnlySession(Session):
+    """
+    只读会话
+
+    连接在第一条语句执行时才从连接池取出，每条语句执行完、结果缓存到内存后立即归还，
+    连接池占用时间只等于实际的数据库时间。需要绑定 autocommit 的 engine，
+    不要用它写数据：每条语句都单独提交，没有事务原子性。
+    """
+
+
+@event.listens_for(ReadOnlySession, "do_orm_execute")
+def _release_connection_after_statement(
+    orm_execute_state: ORMExecuteState,
+) -> Result:  # type: ignore[type-arg]
+    result = orm_execute_state.invoke_statement()
+    frozen = result.freeze()
+    # autocommit 下 commit 不产生数据库往返，只是结束会话事务并归还连接
+    orm_execute_state.session.commit()
+    return frozen()
+
+
+class ReplicaRouter:
+    """
+    只读副本路由
+
+    按轮询顺序返回可用的副本 engine；连接失败的副本会被标记为不可用，
+    在 retry_seconds 之后重新参与轮询。没有可用副本时返回 None，由调用方回退到主库。
+    """
+
+    def __init__(self, engines: list[Engine], *, retry_seconds: float = 30):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._cycle = itertools.cycle(engines)
+        self._down_until: dict[int, float] = {}
+        self._lock = threading.Lock()
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def _on_error(self, context: ExceptionContext) -> None:
+        # 建立连接失败或连接断开时摘除该副本
+        if context.engine is not None and (
+            context.connection is None or context.is_disconnect
+        ):
+            self.mark_down(context.engine)
+
+    def is_healthy(self, replica: Engine) -> bool:
+        return self._down_until.get(id(replica), 0) <= time.monotonic()
+
+    def get_engine(self) -> Engine | None:
+        """返回下一个健康的副本 engine"""
+        with self._lock:
+            for _ in range(len(self.engines)):
+                replica = next(self._cycle)
+                if self.is_healthy(replica):
+                    return replica
+        return None
+
+    def mark_down(self, replica: Engine) -> None:
+        """将副本标记为不可用"""
+        logger.warning(
+            "Replica %s unavailable, skipping for %ss",
+            replica.url.render_as_string(hide_password=True),
+            self.retry_seconds,
+        )
+        with self._lock:
+            self._down_until[id(replica)] = time.monotonic() + self.retry_seconds
+
+
+replica_router = ReplicaRouter(
+    [
+        _instrument_pool(
+            create_engine(
+                str(uri),
+                pool_pre_ping=True,
+                isolation_level="AUTOCOMMIT",
+                poolclass=InstrumentedQueuePool,
+                pool_logging_name=f"replica{i}",
+            )
+        )
+        for i, uri in enumerate(settings.POSTGRES_REPLICA_URIS)
+    ],
+    retry_seconds=settings.POSTGRES_REPLICA_RETRY_SECONDS,
+)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -31,4 +214,5 @@ def init_db(session: Session) -> None:
             is_superuser=True,
         )
         user = user_repository.create(session, obj_in=user_in)
+        session.commit()
 
@@ -54,3 +54,10 @@ class InternalServerError(AppException):
     
     def __init__(self, message: str = "Internal server error"):
         super().__init__(500, message)
+
+
+class ServiceUnavailableError(AppException):
+    """服务繁忙 (503)"""
+    
+    def __init__(self, message: str = "Service unavailable"):
+        super().__init__(503, message)
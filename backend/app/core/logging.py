@@ -4,13 +4,45 @@
 提供应用程序的日志配置，支持：
 - 控制台输出
 - 文件轮转（10MB/文件，保留5个备份）
+- 非阻塞写入：业务线程只把日志记录放进队列，由每个进程唯一的
+  QueueListener 线程完成格式化和磁盘写入
+- 访问日志（app.access）单独写入 access 文件，每行一个 JSON
+- 开启追踪时，span（app.trace）单独写入 trace 文件，每行一个 JSON
 """
+import atexit
 import logging
+import os
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from app.core.config import settings
+from app.core.request_context import RequestIdFilter
+
+_listener: QueueListener | None = None
+
+ACCESS_LOGGER = "app.access"
+TRACE_LOGGER = "app.trace"
+
+
+def _is_access(record: logging.LogRecord) -> bool:
+    return record.name == ACCESS_LOGGER
+
+
+def _is_trace(record: logging.LogRecord) -> bool:
+    return record.name == TRACE_LOGGER
+
+
+def _is_not_access(record: logging.LogRecord) -> bool:
+    return record.name not in (ACCESS_LOGGER, TRACE_LOGGER)
+
+
+def _log_file(log_dir: Path, name: str) -> Path:
+    # 多个 worker 进程轮转同一个文件会互相覆盖，按进程号区分文件名
+    if settings.LOG_FILE_PER_PROCESS:
+        return log_dir / f"{name}.{os.getpid()}.log"
+    return log_dir / f"{name}.log"
 
 
 def setup_logging() -> logging.Logger:
@@ -20,29 +52,33 @@ def setup_logging() -> logging.Logger:
     Returns:
         logging.Logger: 配置好的根日志器
     """
+    global _listener
+    stop_logging()
+    
     # 日志目录
-    log_dir = Path("logs")
+    log_dir = Path(settings.LOG_DIR)
     log_dir.mkdir(exist_ok=True)
     
     # 日志格式
     formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d | %(message)s",
+        "%(asctime)s | %(levelname)-8s | %(request_id)s | %(name)s:%(lineno)d | %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
     
     # 文件处理器（轮转日志）
     file_handler = RotatingFileHandler(
-        log_dir / "app.log",
+        _log_file(log_dir, "app"),
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,
         encoding="utf-8"
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.INFO)
+    file_handler.addFilter(_is_not_access)
     
     # 错误日志单独文件
     error_handler = RotatingFileHandler(
-        log_dir / "error.log",
+        _log_file(log_dir, "error"),
         maxBytes=10 * 1024 * 1024,
         backupCount=5,
         encoding="utf-8"
@@ -50,21 +86,56 @@ def setup_logging() -> logging.Logger:
     error_handler.setFormatter(formatter)
     error_handler.setLevel(logging.ERROR)
     
+    # 访问日志：消息本身就是 JSON
+    access_handler = RotatingFileHandler(
+        _log_file(log_dir, "access"),
+        maxBytes=10 * 1024 * 1024,
+        backupCount=5,
+        encoding="utf-8"
+    )
+    access_handler.setFormatter(logging.Formatter("%(message)s"))
+    access_handler.setLevel(logging.INFO)
+    access_handler.addFilter(_is_access)
+    
+    handlers: list[logging.Handler] = [file_handler, error_handler, access_handler]
+    
+    # 追踪数据：消息本身就是 JSON
+    if settings.TRACING_ENABLED:
+        trace_handler = RotatingFileHandler(
+            _log_file(log_dir, "trace"),
+            maxBytes=10 * 1024 * 1024,
+            backupCount=5,
+            encoding="utf-8"
+        )
+        trace_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_handler.setLevel(logging.INFO)
+        trace_handler.addFilter(_is_trace)
+        handlers.append(trace_handler)
+    
     # 控制台处理器
+    console_level = logging.DEBUG if settings.ENVIRONMENT == "local" else logging.INFO
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.DEBUG if settings.ENVIRONMENT == "local" else logging.INFO)
+    console_handler.setLevel(console_level)
+    console_handler.addFilter(_is_not_access)
+    handlers.append(console_handler)
+    
+    # 业务线程只负责入队，格式化、写文件和轮转都在监听线程中完成
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
     
-    # 配置根日志器
+    # 配置根日志器；级别与最低的处理器级别一致，更低级别的记录不会被创建
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
+    root_logger.setLevel(min(console_level, logging.INFO))
     
     # 清除已有处理器，避免重复
     root_logger.handlers.clear()
     
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
-    root_logger.addHandler(console_handler)
+    queue_handler = QueueHandler(log_queue)
+    # 请求 ID 来自 contextvar，必须在产生日志的线程中读取
+    queue_handler.addFilter(RequestIdFilter())
+    root_logger.addHandler(queue_handler)
     
     # 降低第三方库日志级别
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
@@ -74,6 +145,29 @@ def setup_logging() -> logging.Logger:
     return root_logger
 
 
+def stop_logging() -> None:
+    """停止监听线程，写完队列中剩余的日志并关闭文件"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def _restart_after_fork() -> None:
+    # fork 出的子进程中没有监听线程，重新配置（同时切换到子进程自己的日志文件）
+    global _listener
+    if _listener is not None:
+        _listener = None
+        setup_logging()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     获取指定名称的日志器
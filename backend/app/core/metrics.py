@@ -0,0 +1,130 @@
+"""
+Prometheus 指标
+
+设置 PROMETHEUS_MULTIPROC_DIR 环境变量时使用多进程模式：每个 worker 进程把指标写入
+该目录下的 mmap 文件，/metrics 汇总所有进程的数据。该目录必须在服务启动前清空
+（docker-compose 中挂载为 tmpfs）。Gauge 使用 livesum 模式，只统计存活的进程。
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being processed",
+    multiprocess_mode="livesum",
+)
+
+# 同步处理函数使用的 anyio 线程池
+THREADPOOL_SIZE = Gauge(
+    "threadpool_size", "Threadpool capacity", multiprocess_mode="livesum"
+)
+THREADPOOL_BUSY = Gauge(
+    "threadpool_busy_threads", "Threadpool threads in use", multiprocess_mode="livesum"
+)
+THREADPOOL_WAITING = Gauge(
+    "threadpool_waiting_tasks",
+    "Tasks waiting for a threadpool thread",
+    multiprocess_mode="livesum",
+)
+
+# 数据库连接池
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond pool_size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pool connection (including connecting)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+# 并发限制（密码哈希、登录）
+LIMITER_IN_FLIGHT = Gauge(
+    "concurrency_limiter_in_flight",
+    "Calls holding a limiter slot",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+LIMITER_WAIT = Histogram(
+    "concurrency_limiter_wait_seconds",
+    "Time spent queueing for a limiter slot",
+    ["limiter"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+LIMITER_REJECTED = Counter(
+    "concurrency_limiter_rejected_total",
+    "Calls rejected after the queue timeout",
+    ["limiter"],
+)
+
+# 鉴权：claims（自包含令牌）/ cache（进程内缓存）/ db（查询用户表）
+AUTH_LOOKUPS = Counter(
+    "auth_principal_lookups_total", "Principal resolutions by source", ["source"]
+)
+
+# 进程内缓存（JWT 解码缓存、鉴权用户缓存、令牌版本表），按缓存名称区分
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "In-process cache lookups", ["cache", "result"]
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Entries held by an in-process cache",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+
+# OCR
+OCR_STAGE_DURATION = Histogram(
+    "ocr_stage_duration_seconds",
+    "OCR processing time by stage",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+OCR_IN_PROGRESS = Gauge(
+    "ocr_in_progress",
+    "OCR recognitions currently running",
+    multiprocess_mode="livesum",
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """生成 Prometheus 文本格式的指标（多进程模式下汇总所有进程）"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """进程退出时清理本进程的 livesum Gauge 文件"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())  # type: ignore[no-untyped-call]
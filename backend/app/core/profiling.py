@@ -0,0 +1,134 @@
+"""
+按需性能分析
+
+对单个请求使用 cProfile 做确定性分析，结果为一个 pstats 文件（可用 snakeviz 等工具查看）。
+Python 3.12 之前 cProfile 只记录调用 enable() 的线程，请求在事件循环线程和
+线程池（同步处理函数）中的部分各用一个 Profile，最后合并；
+3.12 起 cProfile 基于 sys.monitoring，一个 Profile 记录所有线程，
+且同一时间只能启用一个，线程池中不再另外启用。
+分析结果中可能混入同一时间段内其他请求的代码。
+"""
+import cProfile
+import functools
+import inspect
+import logging
+import marshal
+import pstats
+import sys
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from fastapi.routing import APIRoute
+from starlette.routing import BaseRoute
+
+logger = logging.getLogger(__name__)
+
+# 3.12 起 cProfile 通过 sys.monitoring 记录所有线程，且同时只能启用一个
+_PROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class ProfileSession:
+    """一个请求的分析数据，可能来自多个线程"""
+
+    def __init__(self) -> None:
+        self._profiles: list[cProfile.Profile] = []
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """分析当前线程中执行的代码块"""
+        with self._lock:
+            if _PROFILE_ALL_THREADS and self._active:
+                # 已启用的 Profile 同时记录当前线程
+                profiler = None
+            else:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # 其他分析工具占用了 sys.monitoring，本次不分析
+                    logger.warning("Another profiler is active, skipping profiling")
+                    profiler = None
+                else:
+                    self._active += 1
+        if profiler is None:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._active -= 1
+                self._profiles.append(profiler)
+
+    def dump(self) -> bytes:
+        """合并所有线程的数据，返回 pstats 文件内容（与 Stats.dump_stats 相同的格式）"""
+        with self._lock:
+            if not self._profiles:
+                return marshal.dumps({})
+            stats = pstats.Stats(*self._profiles)
+        return marshal.dumps(stats.stats)  # type: ignore[attr-defined]
+
+
+profile_session_var: ContextVar[ProfileSession | None] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def _profiled(call: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(call)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        session = profile_session_var.get()
+        if session is None:
+            return call(*args, **kwargs)
+        with session.profile():
+            return call(*args, **kwargs)
+
+    wrapper.__profiled__ = True  # type: ignore[attr-defined]
+    return wrapper
+
+
+def profile_sync_endpoints(routes: Iterable[BaseRoute]) -> None:
+    """
+    包装同步处理函数，使其在线程池中执行时也能被分析
+
+    未开启分析的请求只多一次 contextvar 读取。
+    """
+    for route in routes:
+        # include_router 的实现因 FastAPI 版本而异：展开 Mount 和被包含的子路由
+        nested = getattr(route, "routes", None) or getattr(
+            getattr(route, "original_router", None), "routes", None
+        )
+        if nested:
+            profile_sync_endpoints(nested)
+            continue
+        if not isinstance(route, APIRoute):
+            continue
+        call = route.dependant.call
+        if (
+            call is None
+            or inspect.iscoroutinefunction(call)
+            or getattr(call, "__profiled__", False)
+        ):
+            continue
+        wrapped = _profiled(call)
+        # 已创建的 dependant 和之后按 endpoint 重新生成的路由都使用包装后的函数
+        route.dependant.call = wrapped
+        route.endpoint = wrapped
+
+
+def save_profile(directory: Path, name: str, data: bytes, *, max_files: int) -> Path:
+    """写入 pstats 文件，只保留最新的 max_files 个"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(data)
+    files = sorted(directory.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+    for old in files[: max(len(files) - max_files, 0)]:
+        old.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,45 @@
+"""
+请求上下文
+
+通过 contextvars 在同一请求内（包括线程池中执行的同步处理函数）共享请求 ID
+和统计数据，供访问日志、数据库事件等使用
+"""
+import logging
+from collections import Counter
+from collections.abc import MutableMapping
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class RequestStats:
+    """单个请求内累计的统计数据"""
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    # 按 SQL 文本（参数为占位符）统计执行次数，用于发现 N+1 查询
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """执行次数达到 threshold 的语句，按次数降序"""
+        if threshold <= 0:
+            return []
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+request_stats_var: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+# 当前请求的 ASGI scope，路由匹配后可从 scope["route"] 取得所在路由
+request_scope_var: ContextVar[MutableMapping[str, Any] | None] = ContextVar(
+    "request_scope", default=None
+)
+
+
+class RequestIdFilter(logging.Filter):
+    """把当前请求 ID 写入日志记录（请求之外为 "-"）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
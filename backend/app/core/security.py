@@ -1,27 +1,159 @@
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.limiter import ConcurrencyLimiter
+from app.core.tracing import traced
+from app.schemas.token import TokenPayload
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_pwd_context(
+    schemes: list[str] | str = settings.PASSWORD_HASH_SCHEMES,
+    *,
+    bcrypt_rounds: int = settings.BCRYPT_ROUNDS,
+    argon2_time_cost: int = settings.ARGON2_TIME_COST,
+    argon2_memory_cost: int = settings.ARGON2_MEMORY_COST,
+    argon2_parallelism: int = settings.ARGON2_PARALLELISM,
+) -> CryptContext:
+    """
+    构建密码哈希上下文
+
+    第一个方案之外的方案均标记为过期；bcrypt 的成本因子被固定为 bcrypt_rounds，
+    成本不同的旧哈希同样会被 needs_update 判定为需要升级。
+    """
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+pwd_context = build_pwd_context()
 
 
 ALGORITHM = "HS256"
 
+# token 摘要 -> 已验证的载荷；命中时跳过签名校验和模型校验
+token_cache: TTLCache[bytes, TokenPayload] = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAXSIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS,
+    name="access_token",
+)
+
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    claims: dict[str, Any] | None = None,
+) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> TokenPayload:
+    """
+    校验并解码访问令牌
+
+    Raises:
+        jwt.InvalidTokenError: 签名无效或已过期
+        pydantic.ValidationError: 载荷格式不正确
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        if token_data.exp is not None and token_data.exp <= time.time():
+            token_cache.pop(key)
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        return token_data
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = TokenPayload(**payload)
+    ttl = None if token_data.exp is None else token_data.exp - time.time()
+    token_cache.set(key, token_data, ttl=ttl)
+    return token_data
+
+
+# bcrypt 是 CPU 密集操作，放到独立进程池执行，不占用 Starlette 共享线程池的 CPU 时间；
+# 超过 PASSWORD_HASH_MAX_PENDING 的调用排队，排队超时返回 503
+hash_limiter = ConcurrencyLimiter(
+    "password hashing",
+    limit=settings.PASSWORD_HASH_MAX_PENDING,
+    timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT,
+)
+_hash_executor: Executor | None = None
+_hash_executor_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+def _get_hash_executor() -> Executor | None:
+    global _hash_executor
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    """关闭密码哈希进程池（应用退出时调用）"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(cancel_futures=True)
+            _hash_executor = None
+
+
+def _run_hash_task(fn: Callable[..., T], *args: Any) -> T:
+    with hash_limiter.slot():
+        executor = _get_hash_executor()
+        if executor is None:
+            return fn(*args)
+        return executor.submit(fn, *args).result()
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    verified: bool = pwd_context.verify(plain_password, hashed_password)
+    return verified
+
+
+def _hash(password: str) -> str:
+    hashed: str = pwd_context.hash(password)
+    return hashed
+
+
+@traced("password.verify")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_hash_task(_verify, plain_password, hashed_password)
 
 
+@traced("password.hash")
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run_hash_task(_hash, password)
+
+
+def password_needs_update(hashed_password: str) -> bool:
+    """哈希方案或成本参数与当前配置不一致（只解析哈希串，不做计算）"""
+    needs_update: bool = pwd_context.needs_update(hashed_password)
+    return needs_update
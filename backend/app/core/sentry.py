@@ -0,0 +1,97 @@
+"""
+Sentry 性能追踪采样
+
+错误事件不受这里的采样影响，总是上报。事务（性能追踪）按接口分类采样：
+- 健康检查：SENTRY_TRACES_HEALTH_CHECK_SAMPLE_RATE（接近 0）
+- 登录和 OCR：SENTRY_TRACES_CRITICAL_SAMPLE_RATE
+- 其他接口：SENTRY_TRACES_SAMPLE_RATE
+- 上游已做出采样决定（sentry-trace 头）时沿用上游的决定
+
+默认（SENTRY_TRACES_SLOW_MS = 0）只做头部采样：未采中的请求不记录 span，
+开销最低，但慢请求不保证被保留。
+
+SENTRY_TRACES_SLOW_MS > 0 时开启尾部采样（需要显式配置）：除健康检查外的事务
+先全部记录，结束后由 before_send_transaction 决定是否上报，返回 5xx 或耗时超过
+阈值的总是上报，其余按上面的采样率上报。这样只省掉上报的序列化和网络开销，
+每个请求仍有记录 span 的开销，与全量追踪相近（见 benchmarks/sentry_tracing.py）。
+"""
+import random
+from datetime import datetime
+from typing import Any
+
+from app.core.config import settings
+
+_ERROR_STATUSES = {"internal_error", "unknown_error", "unavailable", "unimplemented"}
+
+
+def _is_health_check(path: str) -> bool:
+    return path.endswith("/utils/health-check/")
+
+
+def route_sample_rate(path: str) -> float:
+    """按请求路径（或路由模板）返回采样率"""
+    if _is_health_check(path):
+        return settings.SENTRY_TRACES_HEALTH_CHECK_SAMPLE_RATE
+    if path.endswith("/login/access-token") or "/ocr/" in path:
+        return settings.SENTRY_TRACES_CRITICAL_SAMPLE_RATE
+    return settings.SENTRY_TRACES_SAMPLE_RATE
+
+
+def traces_sampler(sampling_context: dict[str, Any]) -> float:
+    """事务开始时的采样决定"""
+    parent_sampled = sampling_context.get("parent_sampled")
+    if parent_sampled is not None:
+        return float(parent_sampled)
+    asgi_scope = sampling_context.get("asgi_scope")
+    if asgi_scope is None:
+        # 非 HTTP 事务（后台任务等）
+        return settings.SENTRY_TRACES_SAMPLE_RATE
+    path = asgi_scope.get("path", "")
+    if settings.SENTRY_TRACES_SLOW_MS > 0 and not _is_health_check(path):
+        # 先全部记录，结束后再决定是否上报
+        return 1.0
+    return route_sample_rate(path)
+
+
+def _timestamp(value: datetime | str) -> datetime:
+    # sentry-sdk 1.x 在调用 before_send_transaction 前已把时间格式化为 ISO 字符串
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _duration_ms(event: dict[str, Any]) -> float:
+    start, end = event.get("start_timestamp"), event.get("timestamp")
+    if start is None or end is None:
+        return 0.0
+    return (_timestamp(end) - _timestamp(start)).total_seconds() * 1000
+
+
+def _is_error(event: dict[str, Any]) -> bool:
+    contexts = event.get("contexts", {})
+    status_code = contexts.get("response", {}).get("status_code") or 0
+    return status_code >= 500 or contexts.get("trace", {}).get("status") in _ERROR_STATUSES
+
+
+def before_send_transaction(
+    event: dict[str, Any], _hint: dict[str, Any]
+) -> dict[str, Any] | None:
+    """事务结束时的采样决定（尾部采样），返回 None 表示丢弃"""
+    if settings.SENTRY_TRACES_SLOW_MS <= 0:
+        return event
+    path = event.get("transaction") or ""
+    if (
+        _is_health_check(path)
+        # 延续上游链路的事务已由上游决定采样，丢弃会使链路不完整
+        or "sentry-trace" in event.get("request", {}).get("headers", {})
+        or _is_error(event)
+        or _duration_ms(event) >= settings.SENTRY_TRACES_SLOW_MS
+    ):
+        return event
+    return event if random.random() < route_sample_rate(path) else None
+
+
+def sentry_options() -> dict[str, Any]:
+    """sentry_sdk.init 的性能追踪相关参数"""
+    return {
+        "traces_sampler": traces_sampler,
+        "before_send_transaction": before_send_transaction,
+    }
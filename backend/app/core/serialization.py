@@ -0,0 +1,18 @@
+"""
+JSON 序列化
+
+优先使用 orjson（未安装时回退到标准库），用于访问日志、追踪数据等按行输出的 JSON
+"""
+from typing import Any
+
+try:
+    import orjson  # type: ignore[import-not-found, unused-ignore]
+
+    def dumps(data: Any) -> str:
+        encoded: bytes = orjson.dumps(data, default=str)
+        return encoded.decode()
+except ImportError:  # pragma: no cover
+    import json
+
+    def dumps(data: Any) -> str:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
@@ -0,0 +1,227 @@
+"""
+慢查询日志
+
+超过阈值的语句记录归一化后的 SQL、参数形状（只有类型和长度，不含参数值）、
+耗时和所在路由；按采样率对其中的 SELECT 在后台线程执行
+EXPLAIN (ANALYZE, BUFFERS)，执行计划按行写入 JSONL 文件供离线分析。
+调用 pg_notify、nextval 等有副作用函数的查询只做不执行语句的 EXPLAIN。
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection
+
+from app.core.request_context import request_id_var, request_scope_var
+
+logger = logging.getLogger(__name__)
+
+# 展开后的 IN 列表：IN (%(id_1_1)s, %(id_1_2)s, ...) -> IN (...)
+_EXPANDED_IN_RE = re.compile(r"\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)")
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w%])-?\d+(?:\.\d+)?\b")
+# 只对查询采样；写语句和加锁的查询不采样
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|FOR\s+UPDATE|FOR\s+SHARE)\b", re.IGNORECASE)
+# EXPLAIN ANALYZE 会再执行一次语句；调用这些有副作用的函数的查询只做 EXPLAIN（不执行）
+_SIDE_EFFECT_RE = re.compile(
+    r"\b(pg_notify|nextval|setval|pg_(try_)?advisory\w*|set_config|lo_\w+|dblink\w*"
+    r"|pg_terminate_backend|pg_cancel_backend)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(statement: str) -> str:
+    """折叠空白、IN 列表和字面量，使同一形状的语句得到相同的文本"""
+    sql = " ".join(statement.split())
+    sql = _EXPANDED_IN_RE.sub("(...)", sql)
+    sql = _STRING_LITERAL_RE.sub("?", sql)
+    return _NUMBER_LITERAL_RE.sub("?", sql)
+
+
+def _value_shape(value: Any) -> str:
+    if isinstance(value, list | tuple):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, str | bytes):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shape(parameters: Any) -> Any:
+    """参数的类型和长度，不记录参数值"""
+    if isinstance(parameters, Mapping):
+        return {key: _value_shape(value) for key, value in parameters.items()}
+    if isinstance(parameters, Sequence) and not isinstance(parameters, str | bytes):
+        return [_value_shape(value) for value in parameters]
+    return _value_shape(parameters)
+
+
+def _current_route() -> str | None:
+    scope = request_scope_var.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path")
+    return f"{scope.get('method')} {path}"
+
+
+@dataclass
+class _ExplainJob:
+    engine: Engine
+    statement: str
+    parameters: Any
+    record: dict[str, Any]
+    analyze: bool
+
+
+class SlowQueryLog:
+    """
+    慢查询记录器
+
+    install() 在 Engine 类（或指定的 engine）上注册游标事件；
+    EXPLAIN 任务放入有界队列，由单个后台线程执行，队列满时直接丢弃。
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold_ms: float,
+        explain_sample_rate: float,
+        explain_dir: Path,
+        explain_timeout_ms: int = 10000,
+        queue_size: int = 100,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_dir = explain_dir
+        self.explain_timeout_ms = explain_timeout_ms
+        self._queue: queue.Queue[_ExplainJob] = queue.Queue(maxsize=queue_size)
+        self._worker: threading.Thread | None = None
+        self._worker_pid: int | None = None
+        self._lock = threading.Lock()
+
+    def install(self, target: Any = Engine) -> None:
+        event.listen(target, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(target, "after_cursor_execute", self._after_cursor_execute)
+
+    def uninstall(self, target: Any = Engine) -> None:
+        event.remove(target, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(target, "after_cursor_execute", self._after_cursor_execute)
+
+    def flush(self) -> None:
+        """等待已排队的 EXPLAIN 任务执行完"""
+        self._queue.join()
+
+    @property
+    def explain_path(self) -> Path:
+        return self.explain_dir / f"explain.{os.getpid()}.jsonl"
+
+    def _before_cursor_execute(self, conn: Connection, *_args: Any) -> None:
+        conn.info["slow_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        _cursor: Any,
+        statement: str,
+        parameters: Any,
+        _context: Any,
+        executemany: bool,
+    ) -> None:
+        start = conn.info.pop("slow_query_start", None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration < self.threshold or conn.get_execution_options().get(
+            "slow_query_explain"
+        ):
+            return
+
+        record = {
+            "ts": time.time(),
+            "request_id": request_id_var.get(),
+            "route": _current_route(),
+            "duration_ms": round(duration * 1000, 3),
+            "sql": normalize_sql(statement),
+            "params": (
+                f"{len(parameters)} x {param_shape(parameters[0])}"
+                if executemany and parameters
+                else param_shape(parameters)
+            ),
+        }
+        logger.warning(
+            "Slow query %.1fms in %s params=%s: %s",
+            record["duration_ms"],
+            record["route"],
+            record["params"],
+            record["sql"],
+        )
+        if (
+            not executemany
+            and random.random() < self.explain_sample_rate
+            and _EXPLAINABLE_RE.match(statement)
+            and not _WRITE_RE.search(statement)
+        ):
+            analyze = not _SIDE_EFFECT_RE.search(statement)
+            self._submit(_ExplainJob(conn.engine, statement, parameters, record, analyze))
+
+    def _submit(self, job: _ExplainJob) -> None:
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            logger.debug("EXPLAIN queue full, dropping slow query sample")
+
+    def _ensure_worker(self) -> None:
+        # fork 出的子进程中没有后台线程，按进程号判断是否需要重新启动
+        pid = os.getpid()
+        if self._worker_pid == pid:
+            return
+        with self._lock:
+            if self._worker_pid != pid:
+                self._worker = threading.Thread(
+                    target=self._run, name="slow-query-explain", daemon=True
+                )
+                self._worker.start()
+                self._worker_pid = pid
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._explain(job)
+            except Exception:
+                logger.exception("Failed to capture EXPLAIN for slow query")
+            finally:
+                self._queue.task_done()
+
+    def _explain(self, job: _ExplainJob) -> None:
+        explain_engine = job.engine.execution_options(
+            isolation_level="READ COMMITTED", slow_query_explain=True
+        )
+        with explain_engine.connect() as conn:
+            # 在事务中执行并回滚，statement_timeout 只对本事务生效
+            with conn.begin() as transaction:
+                conn.exec_driver_sql(
+                    f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}"
+                )
+                options = "ANALYZE, BUFFERS, FORMAT JSON" if job.analyze else "FORMAT JSON"
+                # psycopg 把 FORMAT JSON 的结果解析为列表
+                plan: list[dict[str, Any]] = conn.exec_driver_sql(
+                    f"EXPLAIN ({options}) " + job.statement, job.parameters
+                ).scalar_one()
+                transaction.rollback()
+        self.explain_dir.mkdir(parents=True, exist_ok=True)
+        with self.explain_path.open("a", encoding="utf-8") as f:
+            record = {**job.record, "analyzed": job.analyze, "plan": plan}
+            f.write(json.dumps(record, default=str) + "\n")
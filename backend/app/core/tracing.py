@@ -0,0 +1,253 @@
+"""
+请求追踪
+
+轻量的进程内追踪实现，数据模型与 OpenTelemetry 一致：
+- W3C Trace Context：解析请求头 traceparent，采样的请求在响应头中返回 traceparent
+- 头部采样：有上游 traceparent 时沿用其采样标记，否则按 TRACING_SAMPLE_RATE 采样；
+  未采样的请求不创建任何 span，span() / trace_methods 只多一次 contextvar 读取
+- 导出：结束的 span 以 OTLP 字段名输出为一行 JSON，写入 app.trace 日志器，
+  由日志监听线程写到 LOG_DIR/trace.<pid>.log（见 app.core.logging）
+"""
+import functools
+import inspect
+import logging
+import random
+import re
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection, ExceptionContext
+
+from app.core.config import settings
+from app.core.logging import TRACE_LOGGER
+from app.core.serialization import dumps
+
+TRACEPARENT_HEADER = "traceparent"
+
+trace_logger = logging.getLogger(TRACE_LOGGER)
+
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass(slots=True)
+class Span:
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    name: str
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error}
+            if self.error is not None
+            else {"code": "OK"},
+            "resource": {"service.name": settings.PROJECT_NAME},
+        }
+
+
+current_span_var: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """解析 traceparent，返回 (trace_id, parent_span_id, sampled)；格式不合法时返回 None"""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 0x01)
+
+
+def _export(finished: Span) -> None:
+    finished.end_ns = time.time_ns()
+    trace_logger.info(dumps(finished.to_dict()))
+
+
+@contextmanager
+def _activate(active: Span) -> Iterator[Span]:
+    token = current_span_var.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.error = repr(e)
+        raise
+    finally:
+        current_span_var.reset(token)
+        _export(active)
+
+
+@contextmanager
+def start_trace(
+    name: str,
+    *,
+    traceparent: str | None = None,
+    kind: str = "server",
+    attributes: dict[str, Any] | None = None,
+) -> Iterator[Span | None]:
+    """
+    开始一个请求（或后台任务）的根 span
+
+    未开启追踪或未被采样时返回 None，内部的 span() 都不会记录。
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_span_id, sampled = parent
+    else:
+        trace_id, parent_span_id = None, None
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+    if not (settings.TRACING_ENABLED and sampled):
+        yield None
+        return
+    root = Span(
+        trace_id=trace_id or _new_trace_id(),
+        span_id=_new_span_id(),
+        parent_span_id=parent_span_id,
+        name=name,
+        kind=kind,
+        attributes=attributes or {},
+    )
+    with _activate(root):
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """当前请求被采样时创建子 span，否则什么都不做"""
+    parent = current_span_var.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(
+        trace_id=parent.trace_id,
+        span_id=_new_span_id(),
+        parent_span_id=parent.span_id,
+        name=name,
+        attributes=attributes,
+    )
+    with _activate(child):
+        yield child
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """函数装饰器：在 span 中执行"""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if current_span_var.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _traced_method(method_name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        if current_span_var.get() is None:
+            return fn(self, *args, **kwargs)
+        with span(f"{type(self).__name__}.{method_name}"):
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+def trace_methods(cls: type) -> type:
+    """类装饰器：类中定义的公开方法都在 span 中执行，span 名为 实际类名.方法名"""
+    for name, value in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(value):
+            setattr(cls, name, _traced_method(name, value))
+    return cls
+
+
+# ==================== SQL 语句 ====================
+
+
+def _before_cursor_execute(
+    conn: Connection, _cursor: Any, statement: str, *_args: Any
+) -> None:
+    parent = current_span_var.get()
+    if parent is None:
+        return
+    conn.info["trace_span"] = Span(
+        trace_id=parent.trace_id,
+        span_id=_new_span_id(),
+        parent_span_id=parent.span_id,
+        name="db.query",
+        kind="client",
+        attributes={
+            "db.system": "postgresql",
+            "db.statement": " ".join(statement.split())[:2000],
+        },
+    )
+
+
+def _after_cursor_execute(conn: Connection, *_args: Any) -> None:
+    query_span = conn.info.pop("trace_span", None)
+    if query_span is not None:
+        _export(query_span)
+
+
+def _handle_error(context: ExceptionContext) -> None:
+    if context.connection is None:
+        return
+    query_span = context.connection.info.pop("trace_span", None)
+    if query_span is not None:
+        query_span.error = repr(context.original_exception)
+        _export(query_span)
+
+
+def install_sql_tracing(target: Any = Engine) -> None:
+    """为每条 SQL 语句创建 span（作用于所有 engine）"""
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+
+def uninstall_sql_tracing(target: Any = Engine) -> None:
+    event.remove(target, "before_cursor_execute", _before_cursor_execute)
+    event.remove(target, "after_cursor_execute", _after_cursor_execute)
+    event.remove(target, "handle_error", _handle_error)
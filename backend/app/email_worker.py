@@ -0,0 +1,21 @@
+import logging
+
+from app.services.email import email_outbox_worker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    logger.info("Starting email outbox worker")
+    try:
+        email_outbox_worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        email_outbox_worker.mailer.close()
+    logger.info("Email outbox worker stopped")
+
+
+if __name__ == "__main__":
+    main()
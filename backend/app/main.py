@@ -1,19 +1,43 @@
+import secrets
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Annotated
+
 import sentry_sdk
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.middleware import (
+    REQUEST_ID_HEADER,
+    AccessLogMiddleware,
+    CompressionMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    ReadYourWritesMiddleware,
+    TracingMiddleware,
+)
 from app.api.exception_handlers import (
     app_exception_handler,
     validation_exception_handler,
     unhandled_exception_handler,
 )
+from app.core.auth_cache import InvalidationListener
 from app.core.config import settings
+from app.core.db import engine
 from app.core.exceptions import AppException
 from app.core.logging import setup_logging, get_logger
+from app.core.metrics import mark_process_dead, render_metrics
+from app.core.profiling import profile_sync_endpoints
+from app.core.security import shutdown_hash_executor
+from app.core.sentry import sentry_options
+from app.core.tracing import TRACEPARENT_HEADER
+from app.services.email import email_outbox_worker
+from app.utils import preload_email_templates
 
 # 初始化日志系统
 setup_logging()
@@ -25,14 +49,66 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 
 
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
-    sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
+    sentry_sdk.init(dsn=str(settings.SENTRY_DSN), **sentry_options())
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """应用生命周期：启动/停止后台组件"""
+    preload_email_templates()
+    listener = None
+    if settings.AUTH_CACHE_INVALIDATION_CHANNEL:
+        # 每个 worker 进程各自监听鉴权缓存失效通知
+        listener = InvalidationListener(
+            engine.url.set(drivername="postgresql").render_as_string(
+                hide_password=False
+            ),
+            settings.AUTH_CACHE_INVALIDATION_CHANNEL,
+        )
+        listener.start()
+    run_email_worker = (
+        settings.emails_enabled and settings.EMAIL_OUTBOX_WORKER_ENABLED
+    )
+    if run_email_worker:
+        email_outbox_worker.start()
+    yield
+    if run_email_worker:
+        email_outbox_worker.stop()
+    if listener is not None:
+        listener.stop()
+    shutdown_hash_executor()
+    mark_process_dead()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
 
+# 按需性能分析（最内层，只包含路由处理本身）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        profile_dir=Path(settings.LOG_DIR) / "profiles",
+        max_files=settings.PROFILING_MAX_FILES,
+    )
+
+# 写请求之后设置 read_primary cookie（只读副本的 read-your-writes）
+app.add_middleware(ReadYourWritesMiddleware)
+
+# 响应压缩（在访问日志和指标之内，记录的是压缩后的大小）
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        levels={
+            "gzip": settings.COMPRESSION_GZIP_LEVEL,
+            "br": settings.COMPRESSION_BROTLI_LEVEL,
+            "zstd": settings.COMPRESSION_ZSTD_LEVEL,
+        },
+    )
+
 # CORS 中间件
 if settings.all_cors_origins:
     app.add_middleware(
@@ -41,11 +117,47 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[REQUEST_ID_HEADER, TRACEPARENT_HEADER, "ETag"],
     )
 
+# 请求指标
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, route_id=custom_generate_unique_id)
+
+# 请求追踪（在访问日志之内，可以读取请求 ID）
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+# 请求 ID 与访问日志（最外层，耗时包含其他中间件）
+app.add_middleware(AccessLogMiddleware, route_id=custom_generate_unique_id)
+
 # 注册路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", tags=["metrics"], include_in_schema=False)
+    def metrics(authorization: Annotated[str | None, Header()] = None) -> Response:
+        """Prometheus 抓取端点，需要 METRICS_TOKEN"""
+        if not settings.METRICS_TOKEN:
+            raise HTTPException(status_code=404, detail="Not Found")
+        expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+        if not secrets.compare_digest((authorization or "").encode(), expected):
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        data, content_type = render_metrics()
+        return Response(content=data, media_type=content_type)
+
+
+# 同步处理函数在线程池中执行，需要包装后才能被分析
+if settings.PROFILING_ENABLED:
+    profile_sync_endpoints(app.routes)
+
+
 # ==================== 异常处理器 ====================
 
 # 自定义应用异常
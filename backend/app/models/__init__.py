@@ -9,10 +9,12 @@ from sqlmodel import SQLModel
 # 数据库模型
 from app.models.user import User, UserBase
 from app.models.item import Item, ItemBase
+from app.models.email import EmailOutbox
 
 # 请求/响应模型（从 schemas 导入以保持向后兼容）
 from app.schemas.common import ApiResponse, Message, PagedData
 from app.schemas.user import (
+    AuthUser,
     UserCreate,
     UserPublic,
     UserRegister,
@@ -22,11 +24,17 @@ from app.schemas.user import (
     UpdatePassword,
 )
 from app.schemas.item import (
+    ItemBulkResult,
+    ItemBulkUpdate,
     ItemCreate,
     ItemPublic,
+    ItemsBulkCreate,
+    ItemsBulkDelete,
+    ItemsBulkUpdate,
     ItemsPublic,
     ItemUpdate,
 )
+from app.schemas.email import EmailOutboxCreate
 from app.schemas.token import (
     Token,
     TokenPayload,
@@ -41,10 +49,12 @@ __all__ = [
     "UserBase",
     "Item",
     "ItemBase",
+    "EmailOutbox",
     # Schemas (backward compatible)
     "ApiResponse",
     "Message",
     "PagedData",
+    "AuthUser",
     "UserCreate",
     "UserPublic",
     "UserRegister",
@@ -56,6 +66,12 @@ __all__ = [
     "ItemPublic",
     "ItemsPublic",
     "ItemUpdate",
+    "ItemBulkResult",
+    "ItemBulkUpdate",
+    "ItemsBulkCreate",
+    "ItemsBulkDelete",
+    "ItemsBulkUpdate",
+    "EmailOutboxCreate",
     "Token",
     "TokenPayload",
     "NewPassword",
@@ -0,0 +1,48 @@
+"""
+邮件发件箱数据库模型
+"""
+import uuid
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from sqlmodel import Field, SQLModel
+
+EMAIL_PENDING = "pending"
+EMAIL_SENT = "sent"
+EMAIL_FAILED = "failed"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class EmailOutbox(SQLModel, table=True):
+    """待发送的邮件，由 EmailOutboxWorker 批量发送"""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # worker 只扫描待发送的邮件
+        sa.Index(
+            "ix_email_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=sa.text("status = 'pending'"),
+        ),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email_to: str = Field(max_length=255)
+    subject: str = Field(max_length=998)
+    html_content: str = Field(sa_type=sa.Text)
+    status: str = Field(default=EMAIL_PENDING, max_length=16)
+    attempts: int = 0
+    last_error: str | None = Field(default=None, sa_type=sa.Text)
+    created_at: datetime = Field(
+        default_factory=_utcnow,
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False),
+    )
+    next_attempt_at: datetime = Field(
+        default_factory=_utcnow,
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False),
+    )
+    sent_at: datetime | None = Field(
+        default=None, sa_column=sa.Column(sa.DateTime(timezone=True), nullable=True)
+    )
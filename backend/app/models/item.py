@@ -22,4 +22,6 @@ class Item(ItemBase, table=True):
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
+    # 行版本号，每次更新递增，用于 ETag 和乐观并发控制
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     owner: Optional["User"] = Relationship(back_populates="items")
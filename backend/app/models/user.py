@@ -22,4 +22,8 @@ class User(UserBase, table=True):
     """用户数据库模型"""
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
+    # 自包含令牌的版本号，递增后该用户已签发的令牌全部失效
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # 行版本号，每次更新递增，用于 ETag
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     items: List["Item"] = Relationship(back_populates="owner", cascade_delete=True)
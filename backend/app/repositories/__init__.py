@@ -6,6 +6,7 @@ Repositories 模块
 from app.repositories.base import BaseRepository
 from app.repositories.user import UserRepository, user_repository
 from app.repositories.item import ItemRepository, item_repository
+from app.repositories.email import EmailOutboxRepository, email_outbox_repository
 
 __all__ = [
     "BaseRepository",
@@ -13,4 +14,6 @@ __all__ = [
     "user_repository",
     "ItemRepository",
     "item_repository",
+    "EmailOutboxRepository",
+    "email_outbox_repository",
 ]
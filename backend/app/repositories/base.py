@@ -4,15 +4,24 @@ Repository 基类
 提供通用的 CRUD 操作
 """
 import uuid
-from typing import Generic, Type, TypeVar
+from collections.abc import Iterable, Sequence
+from typing import Any, Generic, Type, TypeVar
 
+import sqlalchemy as sa
 from sqlmodel import Session, SQLModel, select
 
+from app.core.tracing import trace_methods
+
 ModelType = TypeVar("ModelType", bound=SQLModel)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=SQLModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=SQLModel)
 
+# UPDATE/DELETE ... RETURNING 的执行选项：
+# 不在 Python 端同步会话，直接用返回的行覆盖身份映射中的对象
+RETURNING_OPTIONS = {"synchronize_session": False, "populate_existing": True}
+
 
+@trace_methods
 class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     """通用 Repository 基类"""
     
@@ -23,15 +32,25 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """根据 ID 获取单个记录"""
         return session.get(self.model, id)
     
+    def get_fields(
+        self, session: Session, id: uuid.UUID, *, fields: Sequence[str]
+    ) -> Any | None:
+        """根据 ID 只查询指定的列，返回行（按列名访问）"""
+        # 用 execute 而不是 exec：exec 在只查询一列时返回标量而不是行
+        return session.execute(self._select(fields).where(self._pk == id)).first()
+
     def get_multi(
         self,
         session: Session,
         *,
         page: int = 1,
         page_size: int = 20,
-    ) -> tuple[list[ModelType], int]:
+        fields: Sequence[str] | None = None,
+    ) -> tuple[list[Any], int]:
         """
         获取分页记录列表
+
+        fields 不为空时只查询这些列，返回行而不是模型对象
         
         Returns:
             (记录列表, 总数)
@@ -39,38 +58,88 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         offset = (page - 1) * page_size
         
         # 获取总数
-        count_statement = select(self.model)
-        total = len(session.exec(count_statement).all())
+        count_statement = select(sa.func.count()).select_from(self.model)
+        total = session.exec(count_statement).one()
         
         # 获取分页数据
-        statement = select(self.model).offset(offset).limit(page_size)
+        statement = self._select(fields).offset(offset).limit(page_size)
         items = list(session.exec(statement).all())
         
         return items, total
     
     def create(self, session: Session, *, obj_in: CreateSchemaType) -> ModelType:
         """创建记录"""
-        db_obj = self.model.model_validate(obj_in)
-        session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
-        return db_obj
+        return self._insert(session, self.model.model_validate(obj_in))
     
     def update(
         self, session: Session, *, db_obj: ModelType, obj_in: UpdateSchemaType
     ) -> ModelType:
         """更新记录"""
         update_data = obj_in.model_dump(exclude_unset=True)
-        db_obj.sqlmodel_update(update_data)
-        session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
-        return db_obj
+        db_obj_id = db_obj.id  # type: ignore[attr-defined]
+        return self._update(session, db_obj_id, update_data) or db_obj
+
+    def update_by_id(
+        self,
+        session: Session,
+        *,
+        id: uuid.UUID,
+        obj_in: UpdateSchemaType,
+        where: Iterable[sa.ColumnElement[bool]] = (),
+    ) -> ModelType | None:
+        """
+        按 ID 更新记录（单条 UPDATE ... RETURNING）
+
+        where 中的附加条件（如所有权）一并放进 WHERE 子句。
+
+        Returns:
+            更新后的记录；记录不存在或不满足条件时返回 None
+        """
+        update_data = obj_in.model_dump(exclude_unset=True)
+        return self._update(session, id, update_data, where)
     
     def delete(self, session: Session, *, id: uuid.UUID) -> ModelType | None:
         """删除记录"""
-        obj = session.get(self.model, id)
-        if obj:
-            session.delete(obj)
-            session.commit()
-        return obj
+        statement = sa.delete(self.model).where(self._pk == id).returning(self.model)
+        return session.scalars(statement, execution_options=RETURNING_OPTIONS).first()
+
+    @property
+    def _pk(self) -> Any:
+        return self.model.id  # type: ignore[attr-defined]
+
+    def _select(self, fields: Sequence[str] | None = None) -> Any:
+        """查询整行，或只查询 fields 中的列"""
+        if not fields:
+            return select(self.model)
+        return select(*(getattr(self.model, name) for name in fields))
+
+    def _insert(self, session: Session, db_obj: ModelType) -> ModelType:
+        """INSERT ... RETURNING，返回的行即为最终状态，无需再 refresh"""
+        statement = (
+            sa.insert(self.model).values(**db_obj.model_dump()).returning(self.model)
+        )
+        return session.scalars(statement).one()
+
+    def _update(
+        self,
+        session: Session,
+        id: uuid.UUID,
+        values: dict[str, Any],
+        where: Iterable[sa.ColumnElement[bool]] = (),
+    ) -> ModelType | None:
+        """UPDATE ... RETURNING，没有匹配的行时返回 None"""
+        if not values:
+            # 没有要更新的字段时仍按相同条件查询，版本号/属主不匹配同样返回 None
+            query = select(self.model).where(self._pk == id, *where)
+            return session.exec(query).first()
+        version = getattr(self.model, "version", None)
+        if version is not None:
+            # 行版本号随每次更新递增
+            values = {**values, "version": version + 1}
+        statement = (
+            sa.update(self.model)
+            .where(self._pk == id, *where)
+            .values(**values)
+            .returning(self.model)
+        )
+        return session.scalars(statement, execution_options=RETURNING_OPTIONS).first()
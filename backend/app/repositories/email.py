@@ -0,0 +1,136 @@
+"""
+Email Outbox Repository
+
+邮件发件箱数据访问层
+"""
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlmodel import Session, SQLModel, col, select
+
+from app.core.tracing import trace_methods
+from app.models import EmailOutbox
+from app.models.email import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT
+from app.repositories.base import RETURNING_OPTIONS, BaseRepository
+from app.schemas import EmailOutboxCreate
+
+# 会话中写入过发件箱的标记，事务提交后据此唤醒本进程的发送 worker
+EMAIL_ENQUEUED_KEY = "email_enqueued"
+# 邮件进入终态（已发送/失败）后正文置空：正文中可能有初始密码、重置密码令牌等敏感信息
+SCRUBBED_CONTENT = ""
+
+
+@trace_methods
+class EmailOutboxRepository(BaseRepository[EmailOutbox, EmailOutboxCreate, SQLModel]):
+    """邮件发件箱 Repository"""
+
+    def __init__(self) -> None:
+        super().__init__(EmailOutbox)
+
+    def enqueue(self, session: Session, *, obj_in: EmailOutboxCreate) -> EmailOutbox:
+        """写入一封待发送的邮件（单条 INSERT，随调用方的事务提交）"""
+        session.info[EMAIL_ENQUEUED_KEY] = True
+        return self._insert(session, EmailOutbox.model_validate(obj_in))
+
+    def claim_due(
+        self, session: Session, *, now: datetime, limit: int, lease_until: datetime
+    ) -> Sequence[EmailOutbox]:
+        """
+        领取一批到期的待发送邮件
+
+        用 FOR UPDATE SKIP LOCKED 选出邮件并把 next_attempt_at 推迟到 lease_until，
+        调用方提交后即释放行锁；租期内其他 worker 不会再领取这些邮件，
+        发送期间无需持有锁和连接。
+        """
+        due = (
+            select(EmailOutbox.id)
+            .where(
+                EmailOutbox.status == EMAIL_PENDING,
+                EmailOutbox.next_attempt_at <= now,
+            )
+            .order_by(col(EmailOutbox.next_attempt_at))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = (
+            sa.update(EmailOutbox)
+            .where(col(EmailOutbox.id).in_(due.scalar_subquery()))
+            .values(next_attempt_at=lease_until)
+            .returning(EmailOutbox)
+        )
+        return session.scalars(statement, execution_options=RETURNING_OPTIONS).all()
+
+    def release(
+        self, session: Session, *, ids: Sequence[uuid.UUID], now: datetime
+    ) -> None:
+        """提前结束租期，邮件在下一轮即可重新领取"""
+        if not ids:
+            return
+        session.execute(
+            sa.update(EmailOutbox)
+            .where(col(EmailOutbox.id).in_(ids))
+            .values(next_attempt_at=now)
+        )
+
+    def mark_sent(
+        self, session: Session, *, ids: Sequence[uuid.UUID], now: datetime
+    ) -> None:
+        """标记为已发送，同时清除正文"""
+        if not ids:
+            return
+        session.execute(
+            sa.update(EmailOutbox)
+            .where(col(EmailOutbox.id).in_(ids))
+            .values(
+                status=EMAIL_SENT,
+                sent_at=now,
+                attempts=col(EmailOutbox.attempts) + 1,
+                last_error=None,
+                html_content=SCRUBBED_CONTENT,
+            )
+        )
+
+    def mark_failed(
+        self,
+        session: Session,
+        *,
+        id: uuid.UUID,
+        error: str,
+        next_attempt_at: datetime | None,
+    ) -> None:
+        """记录一次发送失败；next_attempt_at 为空表示不再重试，此时清除正文"""
+        values: dict[str, object] = {
+            "attempts": col(EmailOutbox.attempts) + 1,
+            "last_error": error,
+        }
+        if next_attempt_at is None:
+            values["status"] = EMAIL_FAILED
+            values["html_content"] = SCRUBBED_CONTENT
+        else:
+            values["next_attempt_at"] = next_attempt_at
+        session.execute(
+            sa.update(EmailOutbox).where(col(EmailOutbox.id) == id).values(**values)
+        )
+
+    def purge(self, session: Session, *, created_before: datetime) -> int:
+        """
+        删除 created_before 之前创建的已发送/失败邮件，待发送的邮件不受影响
+
+        Returns:
+            删除的邮件数
+        """
+        statement = (
+            sa.delete(EmailOutbox)
+            .where(
+                col(EmailOutbox.status).in_((EMAIL_SENT, EMAIL_FAILED)),
+                col(EmailOutbox.created_at) < created_before,
+            )
+            .returning(col(EmailOutbox.id))
+        )
+        return len(session.scalars(statement).all())
+
+
+# 单例实例
+email_outbox_repository = EmailOutboxRepository()
@@ -4,14 +4,23 @@ Item Repository
 Item 数据访问层
 """
 import uuid
+from collections.abc import Sequence
+from typing import Any
 
-from sqlmodel import Session, select, func
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import Session, col, select, func
 
+from app.core.tracing import trace_methods
 from app.models import Item
-from app.schemas import ItemCreate, ItemUpdate
+from app.schemas import ItemBulkUpdate, ItemCreate, ItemUpdate
 from app.repositories.base import BaseRepository
 
+# 批量语句每批的行数，避免单条语句的绑定参数过多
+BULK_CHUNK_SIZE = 1000
 
+
+@trace_methods
 class ItemRepository(BaseRepository[Item, ItemCreate, ItemUpdate]):
     """Item Repository"""
     
@@ -23,10 +32,28 @@ class ItemRepository(BaseRepository[Item, ItemCreate, ItemUpdate]):
     ) -> Item:
         """创建 Item（指定所有者）"""
         db_obj = Item.model_validate(obj_in, update={"owner_id": owner_id})
-        session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
-        return db_obj
+        return self._insert(session, db_obj)
+    
+    def update_owned(
+        self,
+        session: Session,
+        *,
+        id: uuid.UUID,
+        obj_in: ItemUpdate,
+        owner_id: uuid.UUID | None = None,
+        versions: Sequence[int] | None = None,
+    ) -> Item | None:
+        """
+        更新 Item，owner_id 不为空时所有权校验放在 UPDATE 的 WHERE 子句中；
+        versions 不为 None 时只在当前版本号属于 versions 时更新（乐观并发控制）
+        
+        Returns:
+            更新后的 Item；不存在、不属于 owner_id 或版本不匹配时返回 None
+        """
+        where = [] if owner_id is None else [col(Item.owner_id) == owner_id]
+        if versions is not None:
+            where.append(col(Item.version).in_(versions))
+        return self.update_by_id(session, id=id, obj_in=obj_in, where=where)
     
     def get_multi_by_owner(
         self,
@@ -35,8 +62,9 @@ class ItemRepository(BaseRepository[Item, ItemCreate, ItemUpdate]):
         owner_id: uuid.UUID,
         page: int = 1,
         page_size: int = 20,
-    ) -> tuple[list[Item], int]:
-        """获取指定用户的 Items（分页）"""
+        fields: Sequence[str] | None = None,
+    ) -> tuple[list[Any], int]:
+        """获取指定用户的 Items（分页），fields 不为空时只查询这些列"""
         offset = (page - 1) * page_size
         
         # 获取总数
@@ -45,7 +73,7 @@ class ItemRepository(BaseRepository[Item, ItemCreate, ItemUpdate]):
         
         # 获取分页数据
         statement = (
-            select(Item)
+            self._select(fields)
             .where(Item.owner_id == owner_id)
             .offset(offset)
             .limit(page_size)
@@ -53,6 +81,129 @@ class ItemRepository(BaseRepository[Item, ItemCreate, ItemUpdate]):
         items = list(session.exec(statement).all())
         
         return items, total
+    
+    def bulk_create_with_owner(
+        self,
+        session: Session,
+        *,
+        objs_in: Sequence[ItemCreate],
+        owner_id: uuid.UUID,
+    ) -> list[Item]:
+        """
+        批量创建 Item（多行 INSERT ... RETURNING）
+        
+        Returns:
+            与 objs_in 顺序一致的 Item 列表
+        """
+        rows = [
+            {**obj_in.model_dump(), "id": uuid.uuid4(), "owner_id": owner_id}
+            for obj_in in objs_in
+        ]
+        items: list[Item] = []
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            statement = sa.insert(Item).returning(Item, sort_by_parameter_order=True)
+            items.extend(
+                session.scalars(statement, rows[start : start + BULK_CHUNK_SIZE])
+            )
+        return items
+    
+    def bulk_update(
+        self,
+        session: Session,
+        *,
+        objs_in: Sequence[ItemBulkUpdate],
+        owner_id: uuid.UUID | None = None,
+    ) -> list[Item]:
+        """
+        批量更新 Item（UPDATE ... FROM (VALUES ...) RETURNING）
+        
+        owner_id 不为空时只更新该用户拥有的 Item。未设置的字段保持不变，
+        字段集合相同的行合并为一条语句。
+        
+        Returns:
+            实际被更新的 Item 列表
+        """
+        groups: dict[tuple[str, ...], list[ItemBulkUpdate]] = {}
+        for obj_in in objs_in:
+            fields = tuple(sorted(obj_in.model_dump(exclude_unset=True).keys() - {"id"}))
+            groups.setdefault(fields, []).append(obj_in)
+        
+        items: list[Item] = []
+        for fields, group in groups.items():
+            if not fields:
+                # 没有需要更新的字段，只返回当前记录
+                ids = [obj_in.id for obj_in in group]
+                query = select(Item).where(self._id_in(ids))
+                if owner_id is not None:
+                    query = query.where(Item.owner_id == owner_id)
+                items.extend(session.exec(query))
+                continue
+            for start in range(0, len(group), BULK_CHUNK_SIZE):
+                chunk = group[start : start + BULK_CHUNK_SIZE]
+                data = sa.values(
+                    *(
+                        sa.column(name, Item.__table__.c[name].type)  # type: ignore[attr-defined]
+                        for name in ("id", *fields)
+                    ),
+                    name="data",
+                ).data([(obj_in.id, *(getattr(obj_in, f) for f in fields)) for obj_in in chunk])
+                statement = (
+                    sa.update(Item)
+                    .where(col(Item.id) == data.c.id)
+                    .values(
+                        {name: data.c[name] for name in fields}
+                        | {"version": col(Item.version) + 1}
+                    )
+                    .returning(Item)
+                )
+                if owner_id is not None:
+                    statement = statement.where(col(Item.owner_id) == owner_id)
+                items.extend(
+                    session.scalars(
+                        statement,
+                        execution_options={
+                            "synchronize_session": False,
+                            "populate_existing": True,
+                        },
+                    )
+                )
+        return items
+    
+    def bulk_delete(
+        self,
+        session: Session,
+        *,
+        ids: Sequence[uuid.UUID],
+        owner_id: uuid.UUID | None = None,
+    ) -> list[uuid.UUID]:
+        """
+        批量删除 Item（DELETE ... WHERE id = ANY(...)）
+        
+        owner_id 不为空时只删除该用户拥有的 Item。
+        
+        Returns:
+            实际被删除的 Item ID 列表
+        """
+        statement = sa.delete(Item).where(self._id_in(ids)).returning(col(Item.id))
+        if owner_id is not None:
+            statement = statement.where(col(Item.owner_id) == owner_id)
+        deleted = list(
+            session.scalars(statement, execution_options={"synchronize_session": False})
+        )
+        return deleted
+    
+    def get_existing_ids(
+        self, session: Session, *, ids: Sequence[uuid.UUID]
+    ) -> set[uuid.UUID]:
+        """返回 ids 中实际存在的 Item ID"""
+        if not ids:
+            return set()
+        return set(session.exec(select(Item.id).where(self._id_in(ids))))
+    
+    @staticmethod
+    def _id_in(ids: Sequence[uuid.UUID]) -> sa.ColumnElement[bool]:
+        """id = ANY(:ids)，整个 ID 列表作为单个数组参数绑定"""
+        return col(Item.id) == sa.any_(sa.literal(list(ids), ARRAY(sa.Uuid)))
 
 
 # 单例实例
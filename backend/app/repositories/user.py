@@ -5,14 +5,20 @@ User Repository
 """
 import uuid
 
-from sqlmodel import Session, select
+from sqlmodel import Session, col, select
 
+from app.core.auth_cache import invalidate_user
 from app.core.security import get_password_hash, verify_password
+from app.core.tracing import trace_methods
 from app.models import User
 from app.schemas import UserCreate, UserUpdate
 from app.repositories.base import BaseRepository
 
+# 自包含令牌中携带的用户字段，变更时需要使已签发的令牌失效
+TOKEN_CLAIM_FIELDS = frozenset({"email", "is_active", "is_superuser"})
 
+
+@trace_methods
 class UserRepository(BaseRepository[User, UserCreate, UserUpdate]):
     """用户 Repository"""
     
@@ -25,10 +31,7 @@ class UserRepository(BaseRepository[User, UserCreate, UserUpdate]):
             obj_in,
             update={"hashed_password": get_password_hash(obj_in.password)}
         )
-        session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
-        return db_obj
+        return self._insert(session, db_obj)
     
     def update(
         self, session: Session, *, db_obj: User, obj_in: UserUpdate
@@ -37,11 +40,42 @@ class UserRepository(BaseRepository[User, UserCreate, UserUpdate]):
         update_data = obj_in.model_dump(exclude_unset=True)
         if "password" in update_data and update_data["password"]:
             update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
-        db_obj.sqlmodel_update(update_data)
-        session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
-        return db_obj
+        update_data.pop("password", None)
+        if TOKEN_CLAIM_FIELDS & update_data.keys():
+            update_data["token_version"] = User.token_version + 1
+        invalidate_user(session, db_obj.id)
+        return self._update(session, db_obj.id, update_data) or db_obj
+    
+    def revoke_tokens(self, session: Session, *, id: uuid.UUID) -> User | None:
+        """递增令牌版本号，使该用户已签发的自包含令牌全部失效"""
+        invalidate_user(session, id)
+        return self._update(session, id, {"token_version": User.token_version + 1})
+    
+    def get_token_version(self, session: Session, *, id: uuid.UUID) -> int | None:
+        """获取用户当前的令牌版本号，用户不存在时返回 None"""
+        statement = select(User.token_version).where(User.id == id)
+        return session.exec(statement).first()
+    
+    def delete(self, session: Session, *, id: uuid.UUID) -> User | None:
+        """删除用户"""
+        invalidate_user(session, id)
+        return super().delete(session, id=id)
+    
+    def replace_password_hash(
+        self, session: Session, *, id: uuid.UUID, old_hash: str, new_hash: str
+    ) -> bool:
+        """
+        替换密码哈希（同一密码的新哈希）
+
+        只有当前哈希仍为 old_hash 时才更新，避免覆盖期间发生的密码修改。
+        """
+        updated = self._update(
+            session,
+            id,
+            {"hashed_password": new_hash},
+            (col(User.hashed_password) == old_hash,),
+        )
+        return updated is not None
     
     def get_by_email(self, session: Session, *, email: str) -> User | None:
         """根据邮箱获取用户"""
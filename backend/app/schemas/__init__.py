@@ -5,6 +5,7 @@ Schemas 模块
 """
 from app.schemas.common import ApiResponse, Message, PagedData
 from app.schemas.user import (
+    AuthUser,
     UserCreate,
     UserPublic,
     UserRegister,
@@ -14,11 +15,17 @@ from app.schemas.user import (
     UpdatePassword,
 )
 from app.schemas.item import (
+    ItemBulkResult,
+    ItemBulkUpdate,
     ItemCreate,
     ItemPublic,
+    ItemsBulkCreate,
+    ItemsBulkDelete,
+    ItemsBulkUpdate,
     ItemsPublic,
     ItemUpdate,
 )
+from app.schemas.email import EmailOutboxCreate
 from app.schemas.token import (
     Token,
     TokenPayload,
@@ -31,6 +38,7 @@ __all__ = [
     "Message",
     "PagedData",
     # User
+    "AuthUser",
     "UserCreate",
     "UserPublic",
     "UserRegister",
@@ -43,6 +51,13 @@ __all__ = [
     "ItemPublic",
     "ItemsPublic",
     "ItemUpdate",
+    "ItemBulkResult",
+    "ItemBulkUpdate",
+    "ItemsBulkCreate",
+    "ItemsBulkDelete",
+    "ItemsBulkUpdate",
+    # Email
+    "EmailOutboxCreate",
     # Token
     "Token",
     "TokenPayload",
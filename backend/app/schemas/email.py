@@ -0,0 +1,12 @@
+"""
+邮件相关的模型
+"""
+from pydantic import EmailStr
+from sqlmodel import Field, SQLModel
+
+
+class EmailOutboxCreate(SQLModel):
+    """写入发件箱的邮件"""
+    email_to: EmailStr = Field(max_length=255)
+    subject: str = Field(max_length=998)
+    html_content: str
@@ -30,3 +30,35 @@ class ItemsPublic(SQLModel):
     """Item 列表响应（旧版兼容）"""
     data: list[ItemPublic]
     count: int
+
+
+# 单次批量请求允许的最大行数
+ITEMS_BULK_MAX_SIZE = 5000
+
+
+class ItemsBulkCreate(SQLModel):
+    """Item 批量创建请求"""
+    items: list[ItemCreate] = Field(min_length=1, max_length=ITEMS_BULK_MAX_SIZE)
+
+
+class ItemBulkUpdate(ItemUpdate):
+    """Item 批量更新中的单行"""
+    id: uuid.UUID
+
+
+class ItemsBulkUpdate(SQLModel):
+    """Item 批量更新请求"""
+    items: list[ItemBulkUpdate] = Field(min_length=1, max_length=ITEMS_BULK_MAX_SIZE)
+
+
+class ItemsBulkDelete(SQLModel):
+    """Item 批量删除请求"""
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=ITEMS_BULK_MAX_SIZE)
+
+
+class ItemBulkResult(SQLModel):
+    """批量操作中单行的处理结果"""
+    id: uuid.UUID
+    success: bool
+    message: str = "success"
+    data: ItemPublic | None = None
@@ -11,8 +11,13 @@ class Token(SQLModel):
 
 
 class TokenPayload(SQLModel):
-    """JWT Token 载荷"""
+    """JWT Token 载荷（ver 不为空时为携带鉴权声明的自包含令牌）"""
     sub: str | None = None
+    exp: int | None = None
+    email: str | None = None
+    is_active: bool | None = None
+    is_superuser: bool | None = None
+    ver: int | None = None
 
 
 class NewPassword(SQLModel):
@@ -57,3 +57,11 @@ class UsersPublic(SQLModel):
     """用户列表响应（旧版兼容）"""
     data: list[UserPublic]
     count: int
+
+
+class AuthUser(SQLModel):
+    """鉴权所需的用户信息（可在进程内缓存）"""
+    id: uuid.UUID
+    email: str
+    is_active: bool
+    is_superuser: bool
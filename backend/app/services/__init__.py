@@ -5,10 +5,13 @@ Services 模块
 """
 from app.services.item import ItemService, item_service
 from app.services.ocr import OcrService, ocr_service
+from app.services.user import UserService, user_service
 
 __all__ = [
     "ItemService",
     "item_service",
     "OcrService",
     "ocr_service",
+    "UserService",
+    "user_service",
 ]
@@ -0,0 +1,318 @@
+"""
+邮件发送服务
+
+请求处理中只把邮件写入发件箱表（见 app.utils.send_email），
+EmailOutboxWorker 在后台线程（或独立进程 app.email_worker）中批量拉取，
+通过复用的 SMTP 连接发送，失败时按指数退避重试。
+"""
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.tracing import span, start_trace
+from app.models import EmailOutbox
+from app.repositories import email_outbox_repository
+from app.repositories.email import EMAIL_ENQUEUED_KEY
+
+logger = logging.getLogger(__name__)
+
+# 连接级错误：当前批次剩余的邮件留到下一轮，避免逐封等待连接超时
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+class SmtpMailer:
+    """复用同一个 SMTP 连接发送多封邮件"""
+
+    def __init__(
+        self,
+        *,
+        host: str | None,
+        port: int,
+        tls: bool = False,
+        ssl: bool = False,
+        user: str | None = None,
+        password: str | None = None,
+        timeout: float = 30,
+        idle_seconds: float = 60,
+    ):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.ssl = ssl
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.idle_seconds = idle_seconds
+        self._smtp: smtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "SmtpMailer":
+        return cls(
+            host=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            tls=settings.SMTP_TLS,
+            ssl=settings.SMTP_SSL,
+            user=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            timeout=settings.SMTP_TIMEOUT_SECONDS,
+            idle_seconds=settings.EMAIL_OUTBOX_SMTP_IDLE_SECONDS,
+        )
+
+    def send(self, message: EmailMessage) -> None:
+        """发送一封邮件；复用的连接已被服务器断开时重连一次"""
+        smtp = self._connection()
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._connection().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self) -> None:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_seconds:
+            self.close()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+    def _connection(self) -> smtplib.SMTP:
+        # 空闲过久的连接大概率已被服务器关闭，直接重建
+        self.close_if_idle()
+        if self._smtp is None:
+            if not self.host:
+                raise smtplib.SMTPConnectError(-1, b"SMTP_HOST is not configured")
+            if self.ssl:
+                smtp: smtplib.SMTP = smtplib.SMTP_SSL(
+                    self.host,
+                    self.port,
+                    timeout=self.timeout,
+                    context=ssl.create_default_context(),
+                )
+            else:
+                smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.tls:
+                    smtp.starttls(context=ssl.create_default_context())
+            if self.user:
+                smtp.login(self.user, self.password or "")
+            self._smtp = smtp
+            self._last_used = time.monotonic()
+        return self._smtp
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx 响应（如收件人不存在）以及无法构建的邮件重试也不会成功"""
+    if not isinstance(error, smtplib.SMTPException | OSError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def build_message(email: EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = email.subject
+    message["From"] = formataddr(
+        (settings.EMAILS_FROM_NAME or "", str(settings.EMAILS_FROM_EMAIL))
+    )
+    message["To"] = email.email_to
+    message.set_content(email.html_content, subtype="html")
+    return message
+
+
+class EmailOutboxWorker:
+    """
+    发件箱 worker
+
+    每轮在一个短事务中用 SKIP LOCKED 领取一批到期邮件并设置租期，随后逐封发送，
+    每封邮件的结果单独提交；发送期间不持有行锁和数据库连接。
+    多个进程同时运行也不会重复领取；进程崩溃时未记录结果的邮件在租期结束后重新发送。
+    每隔 purge_interval_seconds 删除创建时间早于 retention_seconds 的已发送/失败邮件。
+    """
+
+    def __init__(
+        self,
+        mailer: SmtpMailer,
+        *,
+        batch_size: int = 50,
+        poll_seconds: float = 2.0,
+        max_attempts: int = 8,
+        retry_base_seconds: float = 30,
+        retry_max_seconds: float = 3600,
+        lease_seconds: float = 600,
+        retention_seconds: float = 7 * 24 * 60 * 60,
+        purge_interval_seconds: float = 60 * 60,
+    ):
+        self.mailer = mailer
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._next_purge = 0.0
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="email-outbox-worker", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.mailer.timeout)
+            self._thread = None
+        self.mailer.close()
+
+    def wake(self) -> None:
+        """有新邮件入队，立即开始下一轮"""
+        self._wakeup.set()
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._purge_if_due()
+                processed = self.run_once()
+            except Exception:
+                logger.exception("Email outbox worker failed, retrying")
+                processed = 0
+            if processed < self.batch_size:
+                self.mailer.close_if_idle()
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def purge_expired(self) -> int:
+        """删除超过保留期的已发送/失败邮件，返回删除的邮件数"""
+        created_before = datetime.now(timezone.utc) - timedelta(
+            seconds=self.retention_seconds
+        )
+        with Session(engine) as session, session.begin():
+            purged = email_outbox_repository.purge(
+                session, created_before=created_before
+            )
+        if purged:
+            logger.info("Email outbox: purged %d expired emails", purged)
+        return purged
+
+    def _purge_if_due(self) -> None:
+        if self.retention_seconds <= 0 or time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + self.purge_interval_seconds
+        self.purge_expired()
+
+    def run_once(self) -> int:
+        """发送一批到期邮件，返回本轮处理的邮件数"""
+        now = datetime.now(timezone.utc)
+        with Session(engine, expire_on_commit=False) as session, session.begin():
+            emails = email_outbox_repository.claim_due(
+                session,
+                now=now,
+                limit=self.batch_size,
+                lease_until=now + timedelta(seconds=self.lease_seconds),
+            )
+        if not emails:
+            return 0
+        # 只为领取到邮件的批次开始追踪，空轮询不产生 span
+        with start_trace(
+            "email_outbox.send_batch",
+            kind="internal",
+            attributes={"email.count": len(emails)},
+        ):
+            sent = 0
+            for index, email in enumerate(emails):
+                try:
+                    with span("email.send", **{"email.id": str(email.id)}):
+                        self.mailer.send(build_message(email))
+                except Exception as e:
+                    # 包括无法构建的邮件（如非法的邮件头），记为失败而不影响其他邮件
+                    self._record_failure(email, e, now)
+                    if isinstance(e, _CONNECTION_ERRORS):
+                        self.mailer.close()
+                        # 剩余邮件留到下一轮
+                        self._release(emails[index + 1 :], now)
+                        break
+                else:
+                    self._mark_sent(email, now)
+                    sent += 1
+        logger.info("Email outbox: %d sent, %d claimed", sent, len(emails))
+        return len(emails)
+
+    def _mark_sent(self, email: EmailOutbox, now: datetime) -> None:
+        # 每封邮件单独提交：之后的失败不会让已发送的邮件回到待发送状态
+        with Session(engine) as session, session.begin():
+            email_outbox_repository.mark_sent(session, ids=[email.id], now=now)
+
+    def _release(self, emails: Sequence[EmailOutbox], now: datetime) -> None:
+        if emails:
+            with Session(engine) as session, session.begin():
+                email_outbox_repository.release(
+                    session, ids=[email.id for email in emails], now=now
+                )
+
+    def _record_failure(self, email: EmailOutbox, error: Exception, now: datetime) -> None:
+        attempts = email.attempts + 1
+        next_attempt_at = None
+        if not _is_permanent(error) and attempts < self.max_attempts:
+            delay = min(
+                self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds
+            )
+            next_attempt_at = now + timedelta(seconds=delay)
+        logger.warning(
+            "Failed to send email %s (attempt %d): %r%s",
+            email.id,
+            attempts,
+            error,
+            "" if next_attempt_at else ", giving up",
+        )
+        with Session(engine) as session, session.begin():
+            email_outbox_repository.mark_failed(
+                session, id=email.id, error=repr(error), next_attempt_at=next_attempt_at
+            )
+
+
+email_outbox_worker = EmailOutboxWorker(
+    SmtpMailer.from_settings(),
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_seconds=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    retry_base_seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+    retention_seconds=settings.EMAIL_OUTBOX_RETENTION_DAYS * 24 * 60 * 60,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker_after_commit(session: Session) -> None:
+    if session.info.pop(EMAIL_ENQUEUED_KEY, False):
+        email_outbox_worker.wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, _previous_transaction: object) -> None:
+    session.info.pop(EMAIL_ENQUEUED_KEY, None)
@@ -9,6 +9,7 @@ import uuid
 from sqlmodel import Session
 
 from app.core.exceptions import NotFoundError, ForbiddenError
+from app.core.tracing import trace_methods
 from app.models import Item, User
 from app.schemas import  ItemUpdate
 from app.repositories import item_repository
@@ -16,6 +17,7 @@ from app.repositories import item_repository
 logger = logging.getLogger(__name__)
 
 
+@trace_methods
 class ItemService:
     """Item 服务"""
     
@@ -68,15 +70,18 @@ class ItemService:
             NotFoundError: Item 不存在
             ForbiddenError: 没有权限
         """
-        item = self.get_item_with_permission(
-            session, item_id=item_id, current_user=current_user
+        item = item_repository.update_owned(
+            session,
+            id=item_id,
+            obj_in=item_in,
+            owner_id=None if current_user.is_superuser else current_user.id,
         )
-        
-        update_data = item_in.model_dump(exclude_unset=True)
-        item.sqlmodel_update(update_data)
-        session.add(item)
-        session.commit()
-        session.refresh(item)
+        if item is None:
+            # 没有行被更新：区分不存在和无权限
+            self.get_item_with_permission(
+                session, item_id=item_id, current_user=current_user
+            )
+            raise NotFoundError(f"Item {item_id} not found")
         
         logger.info("Item updated: %s", item.title)
         return item
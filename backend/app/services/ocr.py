@@ -6,16 +6,20 @@ OCR 服务
 from __future__ import annotations
 
 import logging
+import time
 from io import BytesIO
 
 from PIL import Image
 from rapidocr_onnxruntime import RapidOCR
 
+from app.core.metrics import OCR_IN_PROGRESS, OCR_STAGE_DURATION
+from app.core.tracing import trace_methods
 from app.schemas.ocr import OcrResult, OcrTextItem, OcrSimResult
 
 logger = logging.getLogger(__name__)
 
 
+@trace_methods
 class OcrService:
     """OCR 服务（单例模式）"""
     
@@ -38,12 +42,17 @@ class OcrService:
         Returns:
             OcrResult: 识别结果，包含文字列表和完整文本
         """
-        # 将字节转为 PIL Image
-        image = Image.open(BytesIO(image_bytes))
-        
-        # 调用 OCR 引擎
-        result, _ = self._engine(image)  # type: ignore
+        with OCR_IN_PROGRESS.track_inprogress():
+            # 将字节转为 PIL Image
+            with OCR_STAGE_DURATION.labels("decode").time():
+                image = Image.open(BytesIO(image_bytes))
+                image.load()
+            
+            # 调用 OCR 引擎
+            with OCR_STAGE_DURATION.labels("inference").time():
+                result, _ = self._engine(image)  # type: ignore
         
+        start = time.perf_counter()
         items: list[OcrTextItem] = []
         texts: list[str] = []
         
@@ -59,6 +68,7 @@ class OcrService:
                 texts.append(text)
         
         full_text = "\n".join(texts)
+        OCR_STAGE_DURATION.labels("postprocess").observe(time.perf_counter() - start)
         logger.debug("OCR 识别完成，共 %d 条结果", len(items))
         
         return OcrResult(items=items, full_text=full_text)
@@ -0,0 +1,47 @@
+"""
+User 服务
+
+处理 User 相关的业务逻辑
+"""
+import logging
+import uuid
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.core.exceptions import ServiceUnavailableError
+from app.core.security import get_password_hash
+from app.core.tracing import trace_methods
+from app.repositories import user_repository
+
+logger = logging.getLogger(__name__)
+
+
+@trace_methods
+class UserService:
+    """User 服务"""
+
+    def upgrade_password_hash(
+        self, *, user_id: uuid.UUID, hashed_password: str, password: str
+    ) -> None:
+        """
+        按当前哈希配置重新计算密码哈希
+
+        在登录成功后作为后台任务执行，使用独立的会话；
+        哈希进程池繁忙时跳过，等用户下次登录再升级。
+        """
+        try:
+            new_hash = get_password_hash(password)
+        except ServiceUnavailableError:
+            logger.warning("Password hash upgrade skipped for user %s: pool busy", user_id)
+            return
+        with Session(engine) as session, session.begin():
+            upgraded = user_repository.replace_password_hash(
+                session, id=user_id, old_hash=hashed_password, new_hash=new_hash
+            )
+        if upgraded:
+            logger.info("Password hash upgraded for user %s", user_id)
+
+
+# 单例实例
+user_service = UserService()
@@ -4,13 +4,15 @@ from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
-import emails  # type: ignore
 import jwt
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from jwt.exceptions import InvalidTokenError
+from sqlmodel import Session
 
 from app.core import security
 from app.core.config import settings
+from app.repositories import email_outbox_repository
+from app.schemas import EmailOutboxCreate
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,37 +24,52 @@ class EmailData:
     subject: str
 
 
+EMAIL_TEMPLATES_DIR = Path(__file__).parent / "email-templates" / "build"
+EMAIL_TEMPLATE_NAMES = ("new_account.html", "reset_password.html", "test_email.html")
+
+# 模板编译一次后缓存在 Environment 中；模板文件随镜像发布不会变化，关闭 auto_reload
+# 以免每次渲染都检查文件修改时间。字节码缓存让新进程跳过模板编译
+email_templates = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+    bytecode_cache=(
+        FileSystemBytecodeCache(settings.EMAIL_TEMPLATES_BYTECODE_CACHE_DIR)
+        if settings.EMAIL_TEMPLATES_BYTECODE_CACHE
+        else None
+    ),
+    auto_reload=False,
+)
+
+
+def preload_email_templates() -> None:
+    """启动时预先加载并编译所有邮件模板"""
+    for template_name in EMAIL_TEMPLATE_NAMES:
+        email_templates.get_template(template_name)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = email_templates.get_template(template_name).render(context)
     return html_content
 
 
 def send_email(
+    session: Session,
     *,
     email_to: str,
     subject: str = "",
     html_content: str = "",
 ) -> None:
+    """
+    将邮件写入发件箱
+
+    只执行一条 INSERT，随调用方的事务提交；实际发送由 EmailOutboxWorker 完成
+    """
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    email_outbox_repository.enqueue(
+        session,
+        obj_in=EmailOutboxCreate(
+            email_to=email_to, subject=subject, html_content=html_content
+        ),
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logger.info(f"send email result: {response}")
 
 
 def generate_test_email(email_to: str) -> EmailData:
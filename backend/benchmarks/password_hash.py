@@ -0,0 +1,102 @@
+"""
+密码哈希成本基准
+
+对比不同哈希方案和成本参数下单次登录校验的延迟和 CPU 开销，
+用于选择 PASSWORD_HASH_SCHEMES / BCRYPT_ROUNDS / ARGON2_* 配置。
+
+运行（在 backend 目录下）::
+
+    python -m benchmarks.password_hash --iterations 20
+"""
+import argparse
+import logging
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from passlib.context import CryptContext
+
+from app.core.security import build_pwd_context
+
+logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+logger = logging.getLogger(__name__)
+
+PASSWORD = "correct horse battery staple"
+
+CANDIDATES: dict[str, dict[str, Any]] = {
+    "bcrypt-10": {"schemes": ["bcrypt"], "bcrypt_rounds": 10},
+    "bcrypt-12": {"schemes": ["bcrypt"], "bcrypt_rounds": 12},
+    "bcrypt-13": {"schemes": ["bcrypt"], "bcrypt_rounds": 13},
+    "argon2id-t2-m19M-p1": {
+        "schemes": ["argon2"],
+        "argon2_time_cost": 2,
+        "argon2_memory_cost": 19 * 1024,
+        "argon2_parallelism": 1,
+    },
+    "argon2id-t3-m64M-p4": {
+        "schemes": ["argon2"],
+        "argon2_time_cost": 3,
+        "argon2_memory_cost": 64 * 1024,
+        "argon2_parallelism": 4,
+    },
+}
+
+
+@dataclass
+class Result:
+    name: str
+    p50_ms: float
+    p95_ms: float
+    cpu_ms: float
+
+    @property
+    def logins_per_core(self) -> float:
+        return 1000 / self.cpu_ms if self.cpu_ms else float("inf")
+
+
+def bench(name: str, context: CryptContext, iterations: int) -> Result:
+    hashed = context.hash(PASSWORD)
+    wall: list[float] = []
+    cpu_start = time.process_time()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        wall.append((time.perf_counter() - start) * 1000)
+    cpu_ms = (time.process_time() - cpu_start) * 1000 / iterations
+    wall.sort()
+    return Result(
+        name=name,
+        p50_ms=statistics.median(wall),
+        p95_ms=wall[min(len(wall) - 1, int(len(wall) * 0.95))],
+        cpu_ms=cpu_ms,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--only", nargs="*", choices=sorted(CANDIDATES))
+    args = parser.parse_args()
+
+    logger.info(
+        "%-22s %10s %10s %10s %16s",
+        "config", "p50 ms", "p95 ms", "cpu ms", "logins/s/core",
+    )
+    for name, options in CANDIDATES.items():
+        if args.only and name not in args.only:
+            continue
+        try:
+            result = bench(name, build_pwd_context(**options), args.iterations)
+        except Exception as e:  # 例如未安装 argon2-cffi
+            logger.info("%-22s skipped: %s", name, e)
+            continue
+        logger.info(
+            "%-22s %10.1f %10.1f %10.1f %16.1f",
+            result.name, result.p50_ms, result.p95_ms, result.cpu_ms,
+            result.logins_per_core,
+        )
+
+
+if __name__ == "__main__":
+    main()
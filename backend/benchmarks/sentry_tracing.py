@@ -0,0 +1,134 @@
+"""
+Sentry 性能追踪开销基准
+
+对同一个应用分别在不启用 Sentry、只上报错误、按不同采样率头部采样以及
+app.core.sentry 的按接口头部采样（默认）和尾部采样下发送请求，对比每个请求的耗时和
+上报的数据量。事务不会真正发出，只在内存中序列化以计入上报的开销。
+
+运行（在 backend 目录下）::
+
+    python -m benchmarks.sentry_tracing --requests 2000
+"""
+import argparse
+import logging
+import statistics
+import time
+from typing import Any
+from unittest.mock import patch
+
+import sentry_sdk
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sentry_sdk.envelope import Envelope
+from sentry_sdk.transport import Transport
+
+from app.core.config import settings
+from app.core.sentry import sentry_options
+
+logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+ITEMS_PATH = f"{settings.API_V1_STR}/items/"
+
+
+class CountingTransport(Transport):
+    """只序列化不发送，统计上报的事务数和字节数"""
+
+    envelopes = 0
+    bytes_sent = 0
+
+    def capture_envelope(self, envelope: Envelope) -> None:
+        CountingTransport.envelopes += 1
+        CountingTransport.bytes_sent += len(envelope.serialize())
+
+    def capture_event(self, event: dict[str, Any]) -> None:
+        envelope = Envelope()
+        envelope.add_event(event)
+        self.capture_envelope(envelope)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get(ITEMS_PATH)
+    def read_items() -> list[dict[str, Any]]:
+        # 带几个子 span，近似一次有数据库查询的请求
+        with sentry_sdk.start_span(op="db", description="SELECT count(*) FROM item"):
+            pass
+        with sentry_sdk.start_span(op="db", description="SELECT item.* FROM item"):
+            items = [{"id": i, "title": f"item {i}"} for i in range(20)]
+        return items
+
+    return app
+
+
+# 名称 -> sentry_sdk.init 参数（None 表示不初始化 Sentry）
+LEVELS: dict[str, dict[str, Any] | None] = {
+    "no-sentry": None,
+    "errors-only": {},
+    "head-0.01": {"traces_sample_rate": 0.01},
+    "head-0.1": {"traces_sample_rate": 0.1},
+    "head-1.0": {"traces_sample_rate": 1.0},
+    "adaptive-head": {"slow_ms": 0},
+    "adaptive-tail": {"slow_ms": 1000},
+}
+
+
+def init_sentry(options: dict[str, Any]) -> None:
+    init_kwargs: dict[str, Any] = {
+        "dsn": "https://public@sentry.invalid/1",
+        "transport": CountingTransport,
+        # TestClient 基于 httpx，避免 Sentry 给测试请求加上 sentry-trace 头
+        "trace_propagation_targets": [],
+    }
+    if "slow_ms" in options:
+        init_kwargs.update(sentry_options())
+    else:
+        init_kwargs.update(options)
+    sentry_sdk.init(**init_kwargs)
+
+
+def bench(client: TestClient, requests: int) -> tuple[float, float]:
+    for _ in range(min(100, requests)):
+        client.get(ITEMS_PATH)
+    wall: list[float] = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(ITEMS_PATH)
+        wall.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(wall), statistics.median(wall)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = TestClient(build_app())
+    logger.info(
+        "%-15s %10s %10s %12s %12s",
+        "level", "mean ms", "p50 ms", "sent/req", "bytes/req",
+    )
+    baseline = None
+    for name, options in LEVELS.items():
+        if options is not None:
+            # Sentry 的集成安装后无法卸载，"no-sentry" 必须第一个运行
+            init_sentry(options)
+        slow_ms = (options or {}).get("slow_ms", settings.SENTRY_TRACES_SLOW_MS)
+        CountingTransport.envelopes = CountingTransport.bytes_sent = 0
+        with patch.object(settings, "SENTRY_TRACES_SLOW_MS", slow_ms):
+            mean_ms, p50_ms = bench(client, args.requests)
+            sentry_sdk.flush()
+        total = args.requests + min(100, args.requests)
+        baseline = baseline or mean_ms
+        logger.info(
+            "%-15s %10.3f %10.3f %12.3f %12.1f  (%+.1f%%)",
+            name, mean_ms, p50_ms, CountingTransport.envelopes / total,
+            CountingTransport.bytes_sent / total,
+            (mean_ms / baseline - 1) * 100,
+        )
+
+
+if __name__ == "__main__":
+    main()
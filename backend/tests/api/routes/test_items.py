@@ -5,6 +5,7 @@ from sqlmodel import Session
 
 from app.core.config import settings
 from tests.utils.item import create_random_item
+from tests.utils.queries import assert_max_queries
 
 
 def test_create_item(
@@ -29,10 +30,12 @@ def test_read_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
-    response = client.get(
-        f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
-    )
+    item_id = item.id
+    with assert_max_queries(2):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=superuser_token_headers,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["code"] == 200
@@ -74,10 +77,12 @@ def test_read_items(
 ) -> None:
     create_random_item(db)
     create_random_item(db)
-    response = client.get(
-        f"{settings.API_V1_STR}/items/",
-        headers=superuser_token_headers,
-    )
+    # 鉴权 + 总数 + 当前页
+    with assert_max_queries(3):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["code"] == 200
@@ -109,16 +114,55 @@ def test_read_items_with_pagination(
     assert len(content["data"]["items"]) == 2
 
 
+def test_read_items_sparse_fields(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    with assert_max_queries(3) as statements:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/?fields=title,id",
+            headers=superuser_token_headers,
+        )
+    assert response.status_code == 200
+    for item in response.json()["data"]["items"]:
+        assert set(item) == {"id", "title"}
+    # 只查询请求的列
+    [page_query] = [s for s in statements if s.startswith("SELECT item.")]
+    assert "item.description" not in page_query
+    assert "item.owner_id" not in page_query
+
+
+def test_read_item_sparse_fields(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{item.id}?fields=title",
+        headers=normal_user_token_headers,
+    )
+    # 权限检查仍然生效
+    assert response.status_code == 400
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/?fields=title,owner",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 422
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
+    item_id = item.id
     data = {"title": "Updated title", "description": "Updated description"}
-    response = client.put(
-        f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    # UPDATE ... RETURNING 一条语句完成，不再 get/commit/refresh
+    with assert_max_queries(2):
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["code"] == 200
@@ -159,14 +203,88 @@ def test_update_item_not_enough_permissions(
     assert content["message"] == "Not enough permissions"
 
 
-def test_delete_item(
+def test_read_item_conditional(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
-    response = client.delete(
-        f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag == '"1"'
+
+    # 版本号未变时只查询版本号，返回 304
+    headers = {**superuser_token_headers, "If-None-Match": etag}
+    with assert_max_queries(2):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert {"Accept", "Accept-Encoding"} <= set(response.headers["Vary"].split(", "))
+    assert not response.content
+
+    # 字段集不同的表示有不同的 ETag
+    response = client.get(url, headers=headers, params={"fields": "id,title"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # 更新后版本号递增，旧 ETag 不再匹配
+    response = client.put(url, headers=superuser_token_headers, json={"title": "New"})
+    assert response.headers["ETag"] == '"2"'
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"]["title"] == "New"
+
+
+def test_update_item_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    etag = client.get(url, headers=superuser_token_headers).headers["ETag"]
+
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "First"},
+    )
+    assert response.status_code == 200
+    # 另一个客户端仍持有旧 ETag，更新被拒绝
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "Second"},
+    )
+    assert response.status_code == 412
+    # 压缩后的弱 ETag 也可以使用
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": 'W/"2"'},
+        json={"title": "Second"},
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["title"] == "Second"
+    # 空的更新同样校验 If-Match
+    response = client.put(
+        url, headers={**superuser_token_headers, "If-Match": etag}, json={}
     )
+    assert response.status_code == 412
+    response = client.put(
+        url, headers={**superuser_token_headers, "If-Match": '"3"'}, json={}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"3"'
+
+
+def test_delete_item(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    item_id = item.id
+    with assert_max_queries(2):
+        response = client.delete(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=superuser_token_headers,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["code"] == 200
@@ -198,3 +316,98 @@ def test_delete_item_not_enough_permissions(
     content = response.json()
     assert content["code"] == 400
     assert content["message"] == "Not enough permissions"
+
+
+def test_create_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = {"items": [{"title": f"Bulk {i}", "description": "Bulk"} for i in range(3)]}
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["code"] == 200
+    assert [r["data"]["title"] for r in content["data"]] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    assert all(r["success"] for r in content["data"])
+
+
+def test_update_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json={"items": [{"title": "Mine", "description": "Keep"}]},
+    )
+    own_id = response.json()["data"][0]["id"]
+    other_item = create_random_item(db)
+    missing_id = str(uuid.uuid4())
+    data = {
+        "items": [
+            {"id": own_id, "title": "Mine updated"},
+            {"id": str(other_item.id), "title": "Not mine"},
+            {"id": missing_id, "description": None},
+        ]
+    }
+    response = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [r["id"] for r in results] == [own_id, str(other_item.id), missing_id]
+    assert results[0]["success"] is True
+    assert results[0]["data"]["title"] == "Mine updated"
+    assert results[0]["data"]["description"] == "Keep"
+    assert results[1]["success"] is False
+    assert results[1]["message"] == "Not enough permissions"
+    assert results[2]["success"] is False
+    assert results[2]["message"] == "Item not found"
+    db.refresh(other_item)
+    assert other_item.title != "Not mine"
+
+
+def test_delete_items_bulk(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    items = [create_random_item(db) for _ in range(2)]
+    missing_id = str(uuid.uuid4())
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json={"ids": [str(items[0].id), missing_id, str(items[1].id)]},
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [r["success"] for r in results] == [True, False, True]
+    assert results[1]["message"] == "Item not found"
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{items[0].id}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 404
+
+
+def test_write_sets_read_primary_cookie(
+    client: TestClient, superuser_token_headers: dict[str, str], replica: list[str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    response = client.post(url, headers=superuser_token_headers, json={"title": "rw"})
+    assert response.status_code == 200
+    assert "read_primary=1" in response.headers["set-cookie"]
+    item_url = f"{url}{response.json()['data']['id']}"
+    response = client.put(
+        item_url, headers=superuser_token_headers, json={"title": "rw2"}
+    )
+    assert response.status_code == 200
+    assert "read_primary=1" in response.headers["set-cookie"]
+
+    # 带着 cookie 的读请求走主库，能读到刚写入的数据
+    response = client.get(item_url, headers=superuser_token_headers)
+    assert response.json()["data"]["title"] == "rw2"
+    assert replica == []
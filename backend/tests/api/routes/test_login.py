@@ -3,9 +3,10 @@ from unittest.mock import patch
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.api.deps import login_limiter
 from app.core.config import settings
-from app.core.security import verify_password
-from app.models import UserCreate
+from app.core.security import build_pwd_context, password_needs_update, verify_password
+from app.models import User, UserCreate
 from app.repositories import user_repository
 from app.utils import generate_password_reset_token
 from tests.utils.user import user_authentication_headers
@@ -36,6 +37,53 @@ def test_get_access_token_incorrect_password(client: TestClient) -> None:
     assert content["code"] == 400
 
 
+def test_get_access_token_busy(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    with patch.object(login_limiter, "timeout", 0.01):
+        for _ in range(login_limiter.limit):
+            login_limiter._semaphore.acquire()
+        try:
+            r = client.post(
+                f"{settings.API_V1_STR}/login/access-token", data=login_data
+            )
+        finally:
+            for _ in range(login_limiter.limit):
+                login_limiter._semaphore.release()
+    assert r.status_code == 503
+    assert r.json()["code"] == 503
+
+
+def test_login_upgrades_outdated_password_hash(
+    client: TestClient, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = user_repository.create(
+        db, obj_in=UserCreate(email=email, password=password)
+    )
+    outdated_hash = build_pwd_context(bcrypt_rounds=4).hash(password)
+    user.hashed_password = outdated_hash
+    db.add(user)
+    db.commit()
+    assert password_needs_update(outdated_hash)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    assert r.status_code == 200
+
+    db.expire_all()
+    upgraded = db.get(User, user.id)
+    assert upgraded
+    assert upgraded.hashed_password != outdated_hash
+    assert not password_needs_update(upgraded.hashed_password)
+    assert verify_password(password, upgraded.hashed_password)
+
+
 def test_use_access_token(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -93,6 +141,7 @@ def test_reset_password(client: TestClient, db: Session) -> None:
         is_superuser=False,
     )
     user = user_repository.create(db, obj_in=user_create)
+    db.commit()
     token = generate_password_reset_token(email=email)
     headers = user_authentication_headers(client=client, email=email, password=password)
     data = {"new_password": new_password, "token": token}
@@ -1,13 +1,22 @@
+import time
 import uuid
 from unittest.mock import patch
 
+import jwt
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
+from app.api.deps import get_db
+from app.core import security
 from app.core.config import settings
 from app.core.security import verify_password
-from app.models import User, UserCreate
+from app.main import app
+from app.models import AuthUser, User, UserCreate
 from app.repositories import user_repository
+from app.repositories.user import TOKEN_CLAIM_FIELDS
+from tests.utils.queries import assert_max_queries
+from tests.utils.user import create_random_user, user_authentication_headers
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -27,7 +36,10 @@ def test_get_users_superuser_me(
 def test_get_users_normal_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
-    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    with assert_max_queries(2):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers
+        )
     content = r.json()
     assert content["code"] == 200
     current_user = content["data"]
@@ -37,6 +49,20 @@ def test_get_users_normal_user_me(
     assert current_user["email"] == settings.EMAIL_TEST_USER
 
 
+def test_get_users_me_conditional(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/users/me"
+    etag = client.get(url, headers=normal_user_token_headers).headers["ETag"]
+    headers = {**normal_user_token_headers, "If-None-Match": f'W/"0", {etag}'}
+    with assert_max_queries(2):
+        r = client.get(url, headers=headers)
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+    r = client.get(url, headers={**normal_user_token_headers, "If-None-Match": '"0"'})
+    assert r.status_code == 200
+
+
 def test_create_user_new_email(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -68,6 +94,7 @@ def test_get_existing_user(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
     user_id = user.id
     r = client.get(
         f"{settings.API_V1_STR}/users/{user_id}",
@@ -80,12 +107,41 @@ def test_get_existing_user(
     assert existing_user
     assert existing_user.email == api_user["email"]
 
+    r = client.get(
+        f"{settings.API_V1_STR}/users/{user_id}?fields=email",
+        headers=superuser_token_headers,
+    )
+    assert r.json()["data"] == {"email": username}
+
+
+def test_get_existing_user_uses_read_session(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user = user_repository.create(
+        db, obj_in=UserCreate(email=random_email(), password=random_lower_string())
+    )
+    db.commit()
+
+    def no_write_session() -> None:
+        raise AssertionError("GET /users/{user_id} must not open a write session")
+
+    app.dependency_overrides[get_db] = no_write_session
+    try:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+        )
+    finally:
+        app.dependency_overrides.pop(get_db)
+    assert r.status_code == 200
+    assert r.json()["data"]["email"] == user.email
+
 
 def test_get_existing_user_current_user(client: TestClient, db: Session) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
     user_id = user.id
 
     login_data = {
@@ -130,6 +186,7 @@ def test_create_user_existing_username(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user_repository.create(db, obj_in=user_in)
+    db.commit()
     data = {"email": username, "password": password}
     r = client.post(
         f"{settings.API_V1_STR}/users/",
@@ -162,13 +219,17 @@ def test_retrieve_users(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user_repository.create(db, obj_in=user_in)
+    db.commit()
 
     username2 = random_email()
     password2 = random_lower_string()
     user_in2 = UserCreate(email=username2, password=password2)
     user_repository.create(db, obj_in=user_in2)
+    db.commit()
 
-    r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
+    # 鉴权 + 总数 + 当前页
+    with assert_max_queries(3):
+        r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
     content = r.json()
 
     assert content["code"] == 200
@@ -179,6 +240,33 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_sparse_fields(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with assert_max_queries(3) as statements:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/?fields=email,id",
+            headers=superuser_token_headers,
+        )
+    assert r.status_code == 200
+    for item in r.json()["data"]["items"]:
+        assert set(item) == {"id", "email"}
+    [page_query] = [s for s in statements if s.startswith('SELECT "user".')]
+    assert "hashed_password" not in page_query
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me?fields=full_name",
+        headers=superuser_token_headers,
+    )
+    assert set(r.json()["data"]) == {"full_name"}
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/?fields=hashed_password",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 422
+
+
 def test_retrieve_users_with_pagination(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -189,6 +277,7 @@ def test_retrieve_users_with_pagination(
         password = random_lower_string()
         user_in = UserCreate(email=username, password=password)
         user_repository.create(db, obj_in=user_in)
+        db.commit()
 
     r = client.get(
         f"{settings.API_V1_STR}/users/?page=1&page_size=2",
@@ -289,6 +378,7 @@ def test_update_user_me_email_exists(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
 
     data = {"email": user.email}
     r = client.patch(
@@ -368,6 +458,7 @@ def test_update_user(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
 
     data = {"full_name": "Updated_full_name"}
     r = client.patch(
@@ -388,6 +479,31 @@ def test_update_user(
     assert user_db.full_name == "Updated_full_name"
 
 
+def test_update_user_invalidates_auth_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    user = user_repository.create(db, obj_in=user_in)
+    db.commit()
+    headers = user_authentication_headers(
+        client=client, email=username, password=password
+    )
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 400
+    assert r.json()["message"] == "Inactive user"
+
+
 def test_update_user_not_exists(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -410,11 +526,13 @@ def test_update_user_email_exists(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
 
     username2 = random_email()
     password2 = random_lower_string()
     user_in2 = UserCreate(email=username2, password=password2)
     user2 = user_repository.create(db, obj_in=user_in2)
+    db.commit()
 
     data = {"email": user2.email}
     r = client.patch(
@@ -433,6 +551,7 @@ def test_delete_user_me(client: TestClient, db: Session) -> None:
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
     user_id = user.id
 
     login_data = {
@@ -444,10 +563,12 @@ def test_delete_user_me(client: TestClient, db: Session) -> None:
     a_token = tokens["data"]["access_token"]
     headers = {"Authorization": f"Bearer {a_token}"}
 
-    r = client.delete(
-        f"{settings.API_V1_STR}/users/me",
-        headers=headers,
-    )
+    # item 由外键级联删除，不加载 user.items
+    with assert_max_queries(2):
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/me",
+            headers=headers,
+        )
     assert r.status_code == 200
     content = r.json()
     assert content["code"] == 200
@@ -480,6 +601,7 @@ def test_delete_user_super_user(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
     user_id = user.id
     r = client.delete(
         f"{settings.API_V1_STR}/users/{user_id}",
@@ -530,6 +652,7 @@ def test_delete_user_without_privileges(
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
 
     r = client.delete(
         f"{settings.API_V1_STR}/users/{user.id}",
@@ -539,3 +662,97 @@ def test_delete_user_without_privileges(
     content = r.json()
     assert content["code"] == 403
     assert content["message"] == "The user doesn't have enough privileges"
+
+
+def _claims_token_headers(client: TestClient, db: Session) -> tuple[User, dict[str, str]]:
+    username = random_email()
+    password = random_lower_string()
+    user = user_repository.create(db, obj_in=UserCreate(email=username, password=password))
+    db.commit()
+    with patch.object(settings, "ACCESS_TOKEN_EMBED_CLAIMS", True):
+        headers = user_authentication_headers(
+            client=client, email=username, password=password
+        )
+    return user, headers
+
+
+def test_claims_token_authorizes_without_user_lookup(
+    client: TestClient, db: Session
+) -> None:
+    user, headers = _claims_token_headers(client, db)
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+    with patch.object(user_repository, "get_token_version") as get_version, patch(
+        "app.api.deps.user_auth_cache"
+    ) as auth_cache:
+        r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+    get_version.assert_not_called()
+    auth_cache.get.assert_not_called()
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert r.json()["data"]["email"] == user.email
+
+
+@pytest.mark.parametrize("missing", sorted(TOKEN_CLAIM_FIELDS | {"sub"}))
+def test_claims_token_missing_claim_is_rejected(
+    client: TestClient, db: Session, missing: str
+) -> None:
+    user = create_random_user(db)
+    claims = {
+        **AuthUser.model_validate(user).model_dump(mode="json", exclude={"id"}),
+        "ver": user.token_version,
+        "sub": str(user.id),
+    }
+    del claims[missing]
+    payload = {**claims, "exp": int(time.time()) + 60}
+    token = jwt.encode(payload, settings.SECRET_KEY, algorithm=security.ALGORITHM)
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert r.status_code == 403
+    assert r.json()["message"] == "Could not validate credentials"
+
+
+def test_revoke_tokens_me(client: TestClient, db: Session) -> None:
+    _, headers = _claims_token_headers(client, db)
+    r = client.post(f"{settings.API_V1_STR}/users/me/revoke-tokens", headers=headers)
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 403
+    assert r.json()["message"] == "Token has been revoked"
+
+
+def test_update_claim_field_revokes_claims_token(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, headers = _claims_token_headers(client, db)
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"full_name": "Still Valid"},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_superuser": True},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 403
+
+
+def test_revoke_tokens_not_exists(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/users/{uuid.uuid4()}/revoke-tokens",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
@@ -0,0 +1,125 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+from app.core.limiter import ConcurrencyLimiter
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_endpoint(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    before = _sample(
+        "http_request_duration_seconds_count",
+        route="items-read_items",
+        method="GET",
+        status="200",
+    )
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+    assert r.status_code == 200
+
+    with patch.object(settings, "METRICS_TOKEN", "scrape-token"):
+        r = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "http_request_duration_seconds_bucket" in r.text
+    assert "db_pool_checked_out_connections" in r.text
+    assert "threadpool_size" in r.text
+    assert (
+        _sample(
+            "http_request_duration_seconds_count",
+            route="items-read_items",
+            method="GET",
+            status="200",
+        )
+        == before + 1
+    )
+
+
+def test_metrics_endpoint_requires_token(client: TestClient) -> None:
+    # 未配置令牌时不提供 /metrics
+    assert client.get("/metrics").status_code == 404
+    with patch.object(settings, "METRICS_TOKEN", "scrape-token"):
+        assert client.get("/metrics").status_code == 401
+        r = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        assert r.status_code == 401
+        assert "http_request" not in r.text
+
+
+def test_unmatched_route_label(client: TestClient) -> None:
+    before = _sample(
+        "http_request_duration_seconds_count",
+        route="unmatched",
+        method="GET",
+        status="404",
+    )
+    client.get("/no-such-path/12345")
+    client.get("/no-such-path/67890")
+    assert (
+        _sample(
+            "http_request_duration_seconds_count",
+            route="unmatched",
+            method="GET",
+            status="404",
+        )
+        == before + 2
+    )
+
+
+def test_auth_lookup_counter(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    before = _sample("auth_principal_lookups_total", source="cache") + _sample(
+        "auth_principal_lookups_total", source="db"
+    )
+    client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    after = _sample("auth_principal_lookups_total", source="cache") + _sample(
+        "auth_principal_lookups_total", source="db"
+    )
+    assert after == before + 1
+
+
+def test_limiter_metrics() -> None:
+    limiter = ConcurrencyLimiter("metrics-test", limit=1, timeout=0.01)
+    with limiter.slot():
+        assert _sample("concurrency_limiter_in_flight", limiter="metrics-test") == 1
+        with pytest.raises(ServiceUnavailableError):
+            with limiter.slot():
+                pass
+    assert _sample("concurrency_limiter_in_flight", limiter="metrics-test") == 0
+    assert _sample("concurrency_limiter_rejected_total", limiter="metrics-test") == 1
+
+
+def test_cache_metrics(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    def lookups(cache: str) -> tuple[float, float]:
+        return (
+            _sample("cache_lookups_total", cache=cache, result="hit"),
+            _sample("cache_lookups_total", cache=cache, result="miss"),
+        )
+
+    url = f"{settings.API_V1_STR}/users/me"
+    client.get(url, headers=normal_user_token_headers)
+    token_before = lookups("access_token")
+    user_before = lookups("auth_user")
+
+    # 同一令牌的第二次请求命中 JWT 解码缓存和鉴权用户缓存
+    client.get(url, headers=normal_user_token_headers)
+    assert lookups("access_token") == (token_before[0] + 1, token_before[1])
+    assert lookups("auth_user") == (user_before[0] + 1, user_before[1])
+    assert _sample("cache_entries", cache="access_token") >= 1
+    assert _sample("cache_entries", cache="auth_user") >= 1
+
+    with patch.object(settings, "METRICS_TOKEN", "scrape-token"):
+        r = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    for cache in ("access_token", "auth_user", "token_version"):
+        assert f'cache_entries{{cache="{cache}"}}' in r.text
+    assert 'cache_lookups_total{cache="access_token",result="hit"}' in r.text
@@ -0,0 +1,228 @@
+import gzip
+import json
+import logging
+from collections.abc import Iterator
+from typing import Annotated
+from unittest.mock import patch
+
+import brotli
+import pytest
+import zstandard
+from fastapi import FastAPI, Header, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.api.middleware import REQUEST_ID_HEADER, CompressionMiddleware
+from app.api.response import etag_matches, not_modified
+from app.core.compression import negotiate_encoding
+from app.core.config import settings
+
+
+def _access_records(caplog: pytest.LogCaptureFixture) -> list[dict[str, object]]:
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.access"]
+
+
+def test_request_id_is_generated_and_propagated(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    assert r.headers[REQUEST_ID_HEADER]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/health-check/",
+        headers={REQUEST_ID_HEADER: "abc-123"},
+    )
+    assert r.headers[REQUEST_ID_HEADER] == "abc-123"
+
+
+def test_access_log_line(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers={**normal_user_token_headers, REQUEST_ID_HEADER: "req-1"},
+        )
+    assert r.status_code == 200
+    [entry] = _access_records(caplog)
+    assert entry["request_id"] == "req-1"
+    assert entry["route"] == "items-read_items"
+    assert entry["method"] == "GET"
+    assert entry["status"] == 200
+    # 发送的字节数（可能经过压缩）
+    assert entry["response_bytes"] == int(r.headers["content-length"])
+    assert isinstance(entry["db_queries"], int) and entry["db_queries"] >= 1
+    assert isinstance(entry["duration_ms"], float)
+    assert isinstance(entry["db_ms"], float)
+    assert entry["duration_ms"] >= entry["db_ms"]
+
+
+def test_access_log_route_sampling(
+    client: TestClient, caplog: pytest.LogCaptureFixture
+) -> None:
+    with (
+        patch.object(
+            settings, "ACCESS_LOG_ROUTE_SAMPLE_RATES", {"utils-health_check": 0.0}
+        ),
+        caplog.at_level(logging.INFO, logger="app.access"),
+    ):
+        client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    assert _access_records(caplog) == []
+
+
+def test_db_query_headers(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with patch.object(settings, "DB_QUERY_HEADERS", True):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+        )
+    assert int(r.headers["X-DB-Queries"]) >= 2
+    assert float(r.headers["X-DB-Time-Ms"]) > 0
+
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+    assert "X-DB-Queries" not in r.headers
+
+
+def test_repeated_statement_warning(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    with (
+        patch.object(settings, "DB_REPEATED_QUERY_WARN_THRESHOLD", 1),
+        caplog.at_level(logging.WARNING, logger="app.api.middleware"),
+    ):
+        client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+    messages = [r.getMessage() for r in caplog.records if "N+1" in r.getMessage()]
+    assert any("SELECT count(*)" in m for m in messages)
+
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="app.api.middleware"):
+        client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+    assert not any("N+1" in r.getMessage() for r in caplog.records)
+
+
+def test_negotiate_encoding() -> None:
+    available = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, deflate, br, zstd", available) == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert negotiate_encoding("br, *;q=0.1", available) == "br"
+    assert negotiate_encoding("*", available) == "zstd"
+    assert negotiate_encoding("gzip;q=0, identity", available) is None
+    assert negotiate_encoding("", available) is None
+
+
+PAYLOAD = json.dumps([{"id": i, "title": f"item {i}"} for i in range(200)])
+
+
+@pytest.fixture(scope="module")
+def compressed_client() -> Iterator[TestClient]:
+    app = FastAPI()
+
+    @app.get("/large")
+    def large(if_none_match: Annotated[str | None, Header()] = None) -> Response:
+        if if_none_match and etag_matches(if_none_match, '"v1"'):
+            return not_modified('"v1"', if_none_match)
+        return Response(PAYLOAD, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small() -> Response:
+        return Response('{"ok":true}', media_type="application/json")
+
+    @app.get("/image")
+    def image() -> Response:
+        return Response(b"\x89PNG" + b"\0" * 4096, media_type="image/png")
+
+    @app.get("/stream")
+    def stream() -> StreamingResponse:
+        return StreamingResponse(
+            (PAYLOAD[i : i + 500] for i in range(0, len(PAYLOAD), 500)),
+            media_type="application/json",
+        )
+
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=1024,
+        levels={"gzip": 6, "br": 4, "zstd": 3},
+    )
+    with TestClient(app, headers={"Accept-Encoding": "gzip"}) as client:
+        yield client
+
+
+def test_compression(compressed_client: TestClient) -> None:
+    r = compressed_client.get("/large")
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.headers["etag"] == 'W/"v1"'
+    assert int(r.headers["content-length"]) < len(PAYLOAD)
+    assert r.text == PAYLOAD
+
+    r = compressed_client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert r.headers["etag"] == '"v1"'
+
+    for path in ("/small", "/image"):
+        r = compressed_client.get(path)
+        assert "content-encoding" not in r.headers
+
+
+def test_compressed_not_modified(compressed_client: TestClient) -> None:
+    # 304 返回客户端持有的（压缩后的弱）ETag，Vary 与压缩后的 200 一致
+    r = compressed_client.get("/large")
+    etag = r.headers["etag"]
+    r = compressed_client.get("/large", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag == 'W/"v1"'
+    assert {"Accept", "Accept-Encoding"} <= set(r.headers["vary"].split(", "))
+
+    r = compressed_client.get(
+        "/large", headers={"Accept-Encoding": "identity", "If-None-Match": '"v1"'}
+    )
+    assert r.status_code == 304
+    assert r.headers["etag"] == '"v1"'
+
+
+def test_streaming_compression(compressed_client: TestClient) -> None:
+    with compressed_client.stream("GET", "/stream") as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert "content-length" not in r.headers
+        raw = b"".join(r.iter_raw())
+    assert gzip.decompress(raw).decode() == PAYLOAD
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    # 流式压缩的帧头中没有原始长度，需用流式解压
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+DECOMPRESSORS = {
+    "gzip": gzip.decompress,
+    "br": brotli.decompress,
+    "zstd": _zstd_decompress,
+}
+
+
+@pytest.mark.parametrize("encoding", ["zstd", "br", "gzip"])
+def test_compression_codecs(compressed_client: TestClient, encoding: str) -> None:
+    headers = {"Accept-Encoding": encoding}
+    with compressed_client.stream("GET", "/large", headers=headers) as r:
+        assert r.headers["content-encoding"] == encoding
+        raw = b"".join(r.iter_raw())
+    assert int(r.headers["content-length"]) == len(raw) < len(PAYLOAD)
+    assert DECOMPRESSORS[encoding](raw).decode() == PAYLOAD
+
+    with compressed_client.stream("GET", "/stream", headers=headers) as r:
+        assert r.headers["content-encoding"] == encoding
+        assert "content-length" not in r.headers
+        raw = b"".join(r.iter_raw())
+    assert DECOMPRESSORS[encoding](raw).decode() == PAYLOAD
+
+
+def test_server_prefers_zstd(compressed_client: TestClient) -> None:
+    r = compressed_client.get("/large", headers={"Accept-Encoding": "gzip, br, zstd"})
+    assert r.headers["content-encoding"] == "zstd"
+    r = compressed_client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "br"
+    # 客户端（httpx）自动解码
+    assert r.text == PAYLOAD
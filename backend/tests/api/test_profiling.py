@@ -0,0 +1,109 @@
+import marshal
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import middleware
+from app.api.middleware import PROFILE_HEADER, ProfilingMiddleware
+from app.core.profiling import profile_sync_endpoints
+
+
+def _busy_work() -> int:
+    return sum(i * i for i in range(1000))
+
+
+@pytest.fixture
+def profiled_client(tmp_path: Path) -> TestClient:
+    router = APIRouter()
+
+    @router.get("/work")
+    def work() -> dict[str, int]:
+        return {"result": _busy_work()}
+
+    profiled_app = FastAPI()
+    profiled_app.include_router(router, prefix="/api")
+    profile_sync_endpoints(profiled_app.routes)
+    profiled_app.add_middleware(
+        ProfilingMiddleware, profile_dir=tmp_path, max_files=2
+    )
+    return TestClient(profiled_app)
+
+
+def _function_names(data: bytes) -> set[str]:
+    stats = marshal.loads(data)
+    return {name for _file, _line, name in stats}
+
+
+def test_superuser_gets_profile(
+    profiled_client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = profiled_client.get(
+        "/api/work", headers={**superuser_token_headers, PROFILE_HEADER: "return"}
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/octet-stream"
+    assert r.headers["x-profile-status"] == "200"
+    # 线程池中执行的同步处理函数也被记录
+    assert "_busy_work" in _function_names(r.content)
+
+
+def test_profile_query_flag_and_save(
+    profiled_client: TestClient,
+    superuser_token_headers: dict[str, str],
+    tmp_path: Path,
+) -> None:
+    names = []
+    for _ in range(3):
+        r = profiled_client.get("/api/work?_profile=save", headers=superuser_token_headers)
+        assert r.json() == {"result": _busy_work()}
+        names.append(r.headers["x-profile-file"])
+    assert sorted(p.name for p in tmp_path.glob("*.prof")) == sorted(names[1:])
+    assert "_busy_work" in _function_names((tmp_path / names[-1]).read_bytes())
+
+
+def test_normal_user_is_not_profiled(
+    profiled_client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = profiled_client.get(
+        "/api/work", headers={**normal_user_token_headers, PROFILE_HEADER: "return"}
+    )
+    assert r.json() == {"result": _busy_work()}
+    assert "x-profile-status" not in r.headers
+
+
+def test_concurrent_flagged_requests_profile_one(
+    profiled_client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    is_superuser = middleware._is_superuser
+
+    def slow_is_superuser(scope: Any) -> bool:
+        # 鉴权期间第二个请求到达
+        time.sleep(0.2)
+        return is_superuser(scope)
+
+    headers = {**superuser_token_headers, PROFILE_HEADER: "return"}
+    responses: list[Any] = []
+
+    def request() -> None:
+        responses.append(profiled_client.get("/api/work", headers=headers))
+
+    with patch.object(middleware, "_is_superuser", slow_is_superuser):
+        threads = [threading.Thread(target=request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+    assert [r.status_code for r in responses] == [200, 200]
+    profiled = [r for r in responses if "x-profile-status" in r.headers]
+    assert len(profiled) == 1
+    assert "_busy_work" in _function_names(profiled[0].content)
+    [plain] = [r for r in responses if r not in profiled]
+    assert plain.json() == {"result": _busy_work()}
@@ -0,0 +1,109 @@
+import json
+import uuid
+
+import msgpack
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.response import (
+    MSGPACK_MEDIA_TYPE,
+    accepts_msgpack,
+    serialized_paged_response,
+    serialized_success,
+)
+from app.core.config import settings
+from app.models import ItemPublic, UserPublic
+from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user
+
+
+def test_serialized_paged_response(db: Session) -> None:
+    items = [create_random_item(db) for _ in range(3)]
+    response = serialized_paged_response(ItemPublic, items, total=3, page=1, page_size=2)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "items": [
+                ItemPublic.model_validate(item).model_dump(mode="json") for item in items
+            ],
+            "total": 3,
+            "page": 1,
+            "page_size": 2,
+            "pages": 2,
+        },
+    }
+
+
+def test_serialized_only_public_fields(db: Session) -> None:
+    user = create_random_user(db)
+    body = json.loads(serialized_success(UserPublic, user).body)
+    assert body["code"] == 200
+    assert body["data"]["email"] == user.email
+    # 只包含公开字段，不含 hashed_password 等
+    assert set(body["data"]) == set(UserPublic.model_fields)
+    assert json.loads(serialized_success(UserPublic, None).body)["data"] is None
+
+
+def test_openapi_schema_unchanged(client: TestClient) -> None:
+    schema = client.get(f"{settings.API_V1_STR}/openapi.json").json()
+    ref = schema["paths"][f"{settings.API_V1_STR}/items/"]["get"]["responses"]["200"][
+        "content"
+    ]["application/json"]["schema"]["$ref"]
+    assert ref.endswith("ApiResponse_PagedData_ItemPublic__")
+
+
+def test_user_routes_return_public_fields(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    assert set(r.json()["data"]) == set(UserPublic.model_fields)
+
+
+def test_accepts_msgpack() -> None:
+    assert accepts_msgpack("application/msgpack")
+    assert accepts_msgpack("application/x-msgpack, application/json")
+    assert accepts_msgpack("application/msgpack, */*;q=0.1")
+    assert not accepts_msgpack("application/json, application/msgpack;q=0.5")
+    assert not accepts_msgpack("application/msgpack;q=0")
+    assert not accepts_msgpack("*/*")
+
+
+def test_msgpack_round_trip(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    headers = {
+        **normal_user_token_headers,
+        "Accept": MSGPACK_MEDIA_TYPE,
+        "Content-Type": MSGPACK_MEDIA_TYPE,
+    }
+    r = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        content=msgpack.packb({"title": "packed", "description": "msgpack body"}),
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    data = msgpack.unpackb(r.content)["data"]
+    assert data["title"] == "packed"
+    # UUID 以 16 字节二进制编码
+    item_id = uuid.UUID(bytes=data["id"])
+
+    r = client.get(f"{settings.API_V1_STR}/items/{item_id}", headers=headers)
+    assert msgpack.unpackb(r.content)["data"]["id"] == item_id.bytes
+    # 不要求 msgpack 时仍是 JSON
+    r = client.get(
+        f"{settings.API_V1_STR}/items/{item_id}", headers=normal_user_token_headers
+    )
+    assert r.json()["data"]["id"] == str(item_id)
+
+    # 与 JSON 请求体相同的校验规则
+    r = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        content=msgpack.packb({"description": "missing title"}),
+    )
+    assert r.status_code == 422
@@ -1,13 +1,16 @@
 from collections.abc import Generator
+from typing import Any
+from unittest.mock import patch
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, delete
+from sqlalchemy import event
+from sqlmodel import Session, create_engine, delete
 
 from app.core.config import settings
-from app.core.db import engine, init_db
+from app.core.db import ReplicaRouter, engine, init_db
 from app.main import app
-from app.models import Item, User
+from app.models import EmailOutbox, Item, User
 from tests.utils.user import authentication_token_from_email
 from tests.utils.utils import get_superuser_token_headers
 
@@ -21,6 +24,8 @@ def db() -> Generator[Session, None, None]:
         session.execute(statement)
         statement = delete(User)
         session.execute(statement)
+        statement = delete(EmailOutbox)
+        session.execute(statement)
         session.commit()
 
 
@@ -40,3 +45,25 @@ def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]
     return authentication_token_from_email(
         client=client, email=settings.EMAIL_TEST_USER, db=db
     )
+
+
+@pytest.fixture
+def replica(client: TestClient) -> Generator[list[str], None, None]:
+    """
+    把测试库当作只读副本接入路由，返回在副本上执行的语句
+
+    结束后清除客户端的 read_primary cookie，避免影响同一模块的其他测试
+    """
+    replica_engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI), isolation_level="AUTOCOMMIT"
+    )
+    statements: list[str] = []
+
+    def record(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        statements.append(statement)
+
+    event.listen(replica_engine, "before_cursor_execute", record)
+    with patch("app.api.deps.replica_router", ReplicaRouter([replica_engine])):
+        yield statements
+    client.cookies.clear()
+    replica_engine.dispose()
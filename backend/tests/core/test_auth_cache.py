@@ -0,0 +1,48 @@
+import time
+import uuid
+
+from sqlmodel import Session
+
+from app.core.auth_cache import InvalidationListener, invalidate_user, user_auth_cache
+from app.core.db import engine
+from app.models import AuthUser
+
+
+def _cache_user() -> str:
+    user_id = uuid.uuid4()
+    user_auth_cache.set(
+        str(user_id),
+        AuthUser(id=user_id, email="a@example.com", is_active=True, is_superuser=False),
+    )
+    return str(user_id)
+
+
+def test_invalidation_listener_evicts_notified_user() -> None:
+    channel = f"auth_cache_{uuid.uuid4().hex}"
+    listener = InvalidationListener(
+        engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+        channel,
+    )
+    listener.start()
+    try:
+        time.sleep(0.5)
+        key = _cache_user()
+        with Session(engine) as session:
+            session.connection().exec_driver_sql(
+                f"SELECT pg_notify('{channel}', '{key}')"
+            )
+            session.commit()
+        deadline = time.monotonic() + 5
+        while user_auth_cache.get(key) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert user_auth_cache.get(key) is None
+    finally:
+        listener.stop()
+
+
+def test_invalidate_user_evicts_local_cache() -> None:
+    key = _cache_user()
+    with Session(engine) as session:
+        invalidate_user(session, uuid.UUID(key))
+        assert user_auth_cache.get(key) is None
+        session.rollback()
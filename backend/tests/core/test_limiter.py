@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from app.core import security
+from app.core.exceptions import ServiceUnavailableError
+from app.core.limiter import ConcurrencyLimiter
+
+
+def test_limiter_rejects_after_queue_timeout() -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, timeout=0.01)
+    with limiter.slot():
+        assert limiter.stats.in_flight == 1
+        with pytest.raises(ServiceUnavailableError) as exc_info:
+            with limiter.slot():
+                pass
+    assert exc_info.value.code == 503
+    assert limiter.stats.in_flight == 0
+    assert limiter.stats.admitted == 1
+    assert limiter.stats.rejected == 1
+
+
+def test_limiter_queued_call_is_admitted_when_slot_frees() -> None:
+    limiter = ConcurrencyLimiter("test", limit=1, timeout=5)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold() -> None:
+        with limiter.slot():
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    threading.Timer(0.05, release.set).start()
+    with limiter.slot():
+        pass
+    thread.join()
+    assert limiter.stats.admitted == 2
+    assert limiter.stats.rejected == 0
+    assert limiter.stats.wait_seconds_max > 0
+
+
+def test_password_hash_round_trip_through_pool() -> None:
+    hashed = security.get_password_hash("secret-password")
+    assert security.verify_password("secret-password", hashed)
+    assert not security.verify_password("wrong-password", hashed)
@@ -0,0 +1,41 @@
+import logging
+import os
+from collections.abc import Generator
+from logging.handlers import QueueHandler
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.core.logging import setup_logging, stop_logging
+
+
+@pytest.fixture
+def log_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Generator[Path, None, None]:
+    monkeypatch.setattr(settings, "LOG_DIR", str(tmp_path))
+    setup_logging()
+    yield tmp_path
+    monkeypatch.undo()
+    setup_logging()
+
+
+@pytest.mark.usefixtures("log_dir")
+def test_root_logger_only_enqueues() -> None:
+    handlers = logging.getLogger().handlers
+    assert sum(isinstance(h, QueueHandler) for h in handlers) == 1
+    assert not any(isinstance(h, logging.FileHandler) for h in handlers)
+
+
+def test_records_are_written_by_listener_to_per_process_files(log_dir: Path) -> None:
+    logger = logging.getLogger("tests.logging")
+    logger.info("info message")
+    logger.error("error message")
+    stop_logging()
+
+    pid = os.getpid()
+    app_log = (log_dir / f"app.{pid}.log").read_text(encoding="utf-8")
+    error_log = (log_dir / f"error.{pid}.log").read_text(encoding="utf-8")
+    assert "info message" in app_log
+    assert "error message" in app_log
+    assert "info message" not in error_log
+    assert "error message" in error_log
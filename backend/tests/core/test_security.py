@@ -0,0 +1,50 @@
+import time
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
+import jwt
+import pytest
+
+from app.core import security
+
+
+def test_decode_access_token_is_cached() -> None:
+    subject = str(uuid.uuid4())
+    token = security.create_access_token(subject, expires_delta=timedelta(minutes=5))
+    with patch("app.core.security.jwt.decode", wraps=jwt.decode) as decode:
+        assert security.decode_access_token(token).sub == subject
+        assert security.decode_access_token(token).sub == subject
+    assert decode.call_count == 1
+
+
+def test_decode_access_token_rejects_invalid_token() -> None:
+    token = security.create_access_token("x", expires_delta=timedelta(minutes=5))
+    with pytest.raises(jwt.InvalidTokenError):
+        security.decode_access_token(token + "x")
+
+
+def test_decode_access_token_honours_exp() -> None:
+    token = security.create_access_token("x", expires_delta=timedelta(seconds=1))
+    assert security.decode_access_token(token).sub == "x"
+    time.sleep(1.1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        security.decode_access_token(token)
+
+
+def test_argon2_upgrades_bcrypt_hashes() -> None:
+    bcrypt_hash = security.build_pwd_context(["bcrypt"], bcrypt_rounds=4).hash("secret")
+    context = security.build_pwd_context(
+        ["argon2", "bcrypt"],
+        bcrypt_rounds=4,
+        argon2_time_cost=1,
+        argon2_memory_cost=1024,
+        argon2_parallelism=1,
+    )
+    # 旧的 bcrypt 哈希仍可校验，但需要升级为 argon2id
+    assert context.verify("secret", bcrypt_hash)
+    assert context.needs_update(bcrypt_hash)
+    argon2_hash = context.hash("secret")
+    assert argon2_hash.startswith("$argon2id$")
+    assert context.verify("secret", argon2_hash)
+    assert not context.needs_update(argon2_hash)
@@ -0,0 +1,80 @@
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from app.core.config import Settings, settings
+from app.core.sentry import before_send_transaction, traces_sampler
+
+API = settings.API_V1_STR
+
+
+def _sampling_context(path: str, parent_sampled: bool | None = None) -> dict[str, Any]:
+    return {"parent_sampled": parent_sampled, "asgi_scope": {"type": "http", "path": path}}
+
+
+def _transaction(
+    path: str, *, duration_ms: float = 10, status_code: int = 200, **request: Any
+) -> dict[str, Any]:
+    return {
+        "type": "transaction",
+        "transaction": path,
+        "start_timestamp": "2024-01-01T00:00:00.000000Z",
+        "timestamp": f"2024-01-01T00:00:{duration_ms / 1000:09.6f}Z",
+        "contexts": {
+            "trace": {"status": "ok" if status_code < 400 else "internal_error"},
+            "response": {"status_code": status_code},
+        },
+        "request": request,
+    }
+
+
+def test_head_sampling_is_the_default() -> None:
+    # 尾部采样会记录每个请求，需要显式开启
+    assert Settings.model_fields["SENTRY_TRACES_SLOW_MS"].default == 0
+
+
+@pytest.fixture
+def head_only() -> Any:
+    with patch.object(settings, "SENTRY_TRACES_SLOW_MS", 0):
+        yield
+
+
+@pytest.mark.usefixtures("head_only")
+def test_head_sampling_rates() -> None:
+    assert traces_sampler(_sampling_context(f"{API}/utils/health-check/")) == (
+        settings.SENTRY_TRACES_HEALTH_CHECK_SAMPLE_RATE
+    )
+    assert traces_sampler(_sampling_context(f"{API}/login/access-token")) == (
+        settings.SENTRY_TRACES_CRITICAL_SAMPLE_RATE
+    )
+    assert traces_sampler(_sampling_context(f"{API}/ocr/recognize")) == (
+        settings.SENTRY_TRACES_CRITICAL_SAMPLE_RATE
+    )
+    assert traces_sampler(_sampling_context(f"{API}/items/")) == (
+        settings.SENTRY_TRACES_SAMPLE_RATE
+    )
+    # 上游的采样决定优先
+    assert traces_sampler(_sampling_context(f"{API}/items/", parent_sampled=True)) == 1.0
+    assert traces_sampler(_sampling_context(f"{API}/items/", parent_sampled=False)) == 0.0
+    # 头部采样模式下不做尾部过滤
+    event = _transaction(f"{API}/items/")
+    assert before_send_transaction(event, {}) is event
+
+
+def test_tail_sampling_keeps_errors_and_slow_requests() -> None:
+    with (
+        patch.object(settings, "SENTRY_TRACES_SLOW_MS", 500),
+        patch.object(settings, "SENTRY_TRACES_SAMPLE_RATE", 0.0),
+        patch.object(settings, "SENTRY_TRACES_HEALTH_CHECK_SAMPLE_RATE", 0.0),
+    ):
+        # 先全部记录，健康检查除外
+        assert traces_sampler(_sampling_context(f"{API}/items/")) == 1.0
+        assert traces_sampler(_sampling_context(f"{API}/utils/health-check/")) == 0.0
+
+        path = f"{API}/items/{{id}}"
+        assert before_send_transaction(_transaction(path), {}) is None
+        assert before_send_transaction(_transaction(path, duration_ms=800), {})
+        assert before_send_transaction(_transaction(path, status_code=503), {})
+        continued = _transaction(path, headers={"sentry-trace": "abc-def-1"})
+        assert before_send_transaction(continued, {})
@@ -0,0 +1,84 @@
+import json
+import logging
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, select, text
+
+from app.core.db import engine
+from app.core.slow_query import SlowQueryLog, normalize_sql, param_shape
+from app.models import User
+
+
+def test_normalize_sql() -> None:
+    sql = normalize_sql(
+        "SELECT item.id FROM item\n  WHERE item.id IN (%(id_1_1)s, %(id_1_2)s)"
+        " AND item.title = 'it''s' AND item.rank > 10 LIMIT %(param_1)s"
+    )
+    assert sql == (
+        "SELECT item.id FROM item WHERE item.id IN (...)"
+        " AND item.title = ? AND item.rank > ? LIMIT %(param_1)s"
+    )
+
+
+def test_param_shape() -> None:
+    assert param_shape({"email": "a@b.c", "ids": [1, 2, 3], "n": None}) == {
+        "email": "str[5]",
+        "ids": "list[3]",
+        "n": "NoneType",
+    }
+
+
+@pytest.fixture
+def slow_query_log(tmp_path: Path) -> Iterator[SlowQueryLog]:
+    log = SlowQueryLog(threshold_ms=0, explain_sample_rate=1.0, explain_dir=tmp_path)
+    log.install(engine)
+    yield log
+    log.uninstall(engine)
+
+
+def test_slow_select_is_logged_and_explained(
+    slow_query_log: SlowQueryLog, caplog: pytest.LogCaptureFixture
+) -> None:
+    with (
+        caplog.at_level(logging.WARNING, logger="app.core.slow_query"),
+        Session(engine) as session,
+    ):
+        session.exec(select(User).where(User.email == "nobody@example.com")).all()
+    slow_query_log.flush()
+
+    [message] = [r.getMessage() for r in caplog.records]
+    assert "Slow query" in message
+    assert "'email_1': 'str[18]'" in message
+    assert "nobody@example.com" not in message
+
+    [line] = slow_query_log.explain_path.read_text().splitlines()
+    record = json.loads(line)
+    assert record["sql"].startswith('SELECT "user".email')
+    assert record["params"] == {"email_1": "str[18]"}
+    assert record["analyzed"] is True
+    assert record["plan"][0]["Plan"]["Node Type"]
+    assert "Shared Hit Blocks" in record["plan"][0]["Plan"]
+
+
+def test_side_effect_select_is_not_analyzed(slow_query_log: SlowQueryLog) -> None:
+    with Session(engine) as session:
+        session.exec(text("SELECT pg_notify('slow_query_test', 'x')"))
+        session.commit()
+    slow_query_log.flush()
+
+    [line] = slow_query_log.explain_path.read_text().splitlines()
+    record = json.loads(line)
+    # 只有执行计划，没有再次执行语句
+    assert record["analyzed"] is False
+    assert record["plan"][0]["Plan"]["Node Type"]
+    assert "Actual Rows" not in record["plan"][0]["Plan"]
+
+
+def test_writes_are_not_explained(slow_query_log: SlowQueryLog) -> None:
+    with Session(engine) as session:
+        session.exec(text("UPDATE \"user\" SET full_name = full_name WHERE false"))
+        session.rollback()
+    slow_query_log.flush()
+    assert not slow_query_log.explain_path.exists()
@@ -0,0 +1,134 @@
+import json
+import logging
+import uuid
+from collections.abc import Iterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.api.middleware import TracingMiddleware
+from app.core.config import settings
+from app.core.db import engine
+from app.core.tracing import (
+    TRACE_LOGGER,
+    TRACEPARENT_HEADER,
+    install_sql_tracing,
+    parse_traceparent,
+    span,
+    start_trace,
+    trace_methods,
+    uninstall_sql_tracing,
+)
+from app.repositories import item_repository
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_parse_traceparent() -> None:
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (
+        TRACE_ID,
+        PARENT_ID,
+        True,
+    )
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (
+        TRACE_ID,
+        PARENT_ID,
+        False,
+    )
+    assert parse_traceparent(f"ff-{TRACE_ID}-{PARENT_ID}-01") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+@pytest.fixture
+def tracing(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 1.0)
+    install_sql_tracing(engine)
+    yield
+    uninstall_sql_tracing(engine)
+
+
+def _spans(caplog: pytest.LogCaptureFixture) -> list[dict[str, object]]:
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == TRACE_LOGGER]
+
+
+@pytest.fixture
+def traced_client() -> TestClient:
+    traced_app = FastAPI()
+
+    @traced_app.get("/items/{id}")
+    def read(id: uuid.UUID) -> dict[str, bool]:
+        with Session(engine) as session:
+            return {"found": item_repository.get(session, id) is not None}
+
+    traced_app.add_middleware(TracingMiddleware)
+    return TestClient(traced_app)
+
+
+@pytest.mark.usefixtures("tracing")
+def test_request_spans_follow_traceparent(
+    traced_client: TestClient, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.INFO, logger=TRACE_LOGGER):
+        r = traced_client.get(
+            f"/items/{uuid.uuid4()}",
+            headers={TRACEPARENT_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-01"},
+        )
+    assert r.json() == {"found": False}
+    trace_id, root_id, sampled = parse_traceparent(r.headers[TRACEPARENT_HEADER])  # type: ignore[misc]
+    assert trace_id == TRACE_ID and sampled
+
+    spans = {s["name"]: s for s in _spans(caplog)}
+    assert {s["traceId"] for s in spans.values()} == {TRACE_ID}
+    root = spans["GET /items/{id}"]
+    assert root["spanId"] == root_id
+    assert root["parentSpanId"] == PARENT_ID
+    assert root["attributes"]["http.status_code"] == 200  # type: ignore[index]
+    repository = spans["ItemRepository.get"]
+    assert repository["parentSpanId"] == root_id
+    query = spans["db.query"]
+    assert query["parentSpanId"] == repository["spanId"]
+    assert "FROM item" in query["attributes"]["db.statement"]  # type: ignore[index]
+
+
+@pytest.mark.usefixtures("tracing")
+def test_unsampled_parent_is_respected(
+    traced_client: TestClient, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.INFO, logger=TRACE_LOGGER):
+        r = traced_client.get(
+            f"/items/{uuid.uuid4()}",
+            headers={TRACEPARENT_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-00"},
+        )
+    assert r.status_code == 200
+    assert TRACEPARENT_HEADER not in r.headers
+    assert _spans(caplog) == []
+
+
+@pytest.mark.usefixtures("tracing")
+def test_trace_methods_records_errors(caplog: pytest.LogCaptureFixture) -> None:
+    @trace_methods
+    class Service:
+        def fail(self) -> None:
+            raise ValueError("boom")
+
+    class SubService(Service):
+        pass
+
+    with caplog.at_level(logging.INFO, logger=TRACE_LOGGER):
+        with pytest.raises(ValueError), start_trace("job", kind="internal"):
+            SubService().fail()
+        # 没有根 span 时不记录
+        with span("orphan"):
+            pass
+
+    failed, root = _spans(caplog)
+    assert failed["name"] == "SubService.fail"
+    assert failed["status"] == {"code": "ERROR", "message": "ValueError('boom')"}
+    assert root["name"] == "job"
+    assert root["status"] == {"code": "ERROR", "message": "ValueError('boom')"}
@@ -0,0 +1,35 @@
+import uuid
+
+from sqlmodel import Session
+
+from app.models import ItemUpdate
+from app.repositories import item_repository
+from tests.utils.item import create_random_item
+
+
+def test_update_owned_item(db: Session) -> None:
+    item = create_random_item(db)
+    updated = item_repository.update_owned(
+        db, id=item.id, obj_in=ItemUpdate(title="Updated"), owner_id=item.owner_id
+    )
+    assert updated
+    assert updated.id == item.id
+    assert updated.title == "Updated"
+    assert updated.description == item.description
+
+
+def test_update_owned_item_wrong_owner(db: Session) -> None:
+    item = create_random_item(db)
+    updated = item_repository.update_owned(
+        db, id=item.id, obj_in=ItemUpdate(title="Updated"), owner_id=uuid.uuid4()
+    )
+    assert updated is None
+    db.refresh(item)
+    assert item.title != "Updated"
+
+
+def test_update_owned_item_not_found(db: Session) -> None:
+    updated = item_repository.update_owned(
+        db, id=uuid.uuid4(), obj_in=ItemUpdate(title="Updated")
+    )
+    assert updated is None
@@ -90,3 +90,19 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_replace_password_hash_skips_changed_password(db: Session) -> None:
+    user = user_repository.create(
+        db, obj_in=UserCreate(email=random_email(), password=random_lower_string())
+    )
+    old_hash = user.hashed_password
+    assert not user_repository.replace_password_hash(
+        db, id=user.id, old_hash="stale", new_hash="new"
+    )
+    assert user_repository.replace_password_hash(
+        db, id=user.id, old_hash=old_hash, new_hash="new"
+    )
+    db.commit()
+    db.refresh(user)
+    assert user.hashed_password == "new"
@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from jinja2 import TemplateNotFound
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.main import app
+from app.models import EmailOutbox, EmailOutboxCreate
+from app.models.email import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT
+from app.repositories import email_outbox_repository
+from app.services.email import EmailOutboxWorker, SmtpMailer
+from app.utils import (
+    EMAIL_TEMPLATE_NAMES,
+    email_templates,
+    generate_new_account_email,
+    preload_email_templates,
+)
+from tests.utils.smtp import SmtpSink, smtp_sink
+from tests.utils.utils import random_email
+
+
+def _worker(sink: SmtpSink) -> EmailOutboxWorker:
+    return EmailOutboxWorker(
+        SmtpMailer(host=sink.host, port=sink.port, timeout=5),
+        retry_base_seconds=60,
+    )
+
+
+def _enqueue(db: Session, email_to: str) -> EmailOutbox:
+    email = email_outbox_repository.enqueue(
+        db,
+        obj_in=EmailOutboxCreate(
+            email_to=email_to, subject="Hello", html_content="<p>hi</p>"
+        ),
+    )
+    db.commit()
+    return email
+
+
+def test_worker_sends_batch_over_one_connection(db: Session) -> None:
+    recipients = [random_email() for _ in range(3)]
+    emails = [_enqueue(db, email_to) for email_to in recipients]
+    with smtp_sink() as sink:
+        worker = _worker(sink)
+        worker.run_once()
+        worker.mailer.close()
+    assert sink.connections == 1
+    assert {m["To"] for m in sink.messages} >= set(recipients)
+    for email in emails:
+        db.refresh(email)
+        assert email.status == EMAIL_SENT
+        assert email.sent_at is not None
+        assert email.attempts == 1
+        # 正文中可能有密码或令牌，发送后不再保留
+        assert email.html_content == ""
+
+
+def test_worker_retries_temporary_failure_with_backoff(db: Session) -> None:
+    email = _enqueue(db, random_email())
+    with smtp_sink() as sink:
+        sink.rcpt_responses[email.email_to] = "451 try again later"
+        worker = _worker(sink)
+        worker.run_once()
+        worker.mailer.close()
+    db.refresh(email)
+    assert email.status == EMAIL_PENDING
+    assert email.attempts == 1
+    assert email.last_error
+    assert email.next_attempt_at > datetime.now(timezone.utc)
+    # 还会重试，正文保留
+    assert email.html_content == "<p>hi</p>"
+
+
+def test_worker_gives_up_on_permanent_failure(db: Session) -> None:
+    email = _enqueue(db, random_email())
+    with smtp_sink() as sink:
+        sink.rcpt_responses[email.email_to] = "550 no such user"
+        worker = _worker(sink)
+        worker.run_once()
+        worker.mailer.close()
+    db.refresh(email)
+    assert email.status == EMAIL_FAILED
+    assert email.html_content == ""
+
+
+def test_worker_purges_expired_emails(db: Session) -> None:
+    old_sent, old_failed, old_pending, recent_sent = (
+        _enqueue(db, random_email()) for _ in range(4)
+    )
+    now = datetime.now(timezone.utc)
+    email_outbox_repository.mark_sent(db, ids=[old_sent.id, recent_sent.id], now=now)
+    email_outbox_repository.mark_failed(
+        db, id=old_failed.id, error="550", next_attempt_at=None
+    )
+    for email in (old_sent, old_failed, old_pending):
+        email.created_at = now - timedelta(days=8)
+        db.add(email)
+    db.commit()
+
+    worker = EmailOutboxWorker(
+        SmtpMailer(host="localhost", port=0), retention_seconds=7 * 24 * 60 * 60
+    )
+    ids = [email.id for email in (old_sent, old_failed, old_pending, recent_sent)]
+    assert worker.purge_expired() == 2
+    db.expire_all()
+    remaining = db.exec(select(EmailOutbox.id).where(col(EmailOutbox.id).in_(ids)))
+    # 待发送的邮件和保留期内的邮件不受影响
+    assert set(remaining) == {old_pending.id, recent_sent.id}
+
+
+def test_worker_records_unbuildable_message_and_keeps_others(db: Session) -> None:
+    bad = email_outbox_repository.enqueue(
+        db,
+        obj_in=EmailOutboxCreate(
+            email_to=random_email(), subject="Hello\nBcc: x@example.com", html_content="x"
+        ),
+    )
+    db.commit()
+    good = _enqueue(db, random_email())
+    with smtp_sink() as sink:
+        worker = _worker(sink)
+        worker.run_once()
+        # 已发送的邮件不会因为同批次的失败被再次发送
+        worker.run_once()
+        worker.mailer.close()
+    assert [m["To"] for m in sink.messages].count(good.email_to) == 1
+    db.refresh(bad)
+    db.refresh(good)
+    assert bad.status == EMAIL_FAILED
+    assert "ValueError" in (bad.last_error or "")
+    assert good.status == EMAIL_SENT
+
+
+def test_worker_does_not_hold_row_locks_while_sending(db: Session) -> None:
+    email = _enqueue(db, random_email())
+    locked: list[bool] = []
+
+    def send(_message: object) -> None:
+        with Session(engine) as other:
+            # NOWAIT：行仍被领取的事务锁定时立即报错
+            try:
+                other.exec(
+                    select(EmailOutbox)
+                    .where(EmailOutbox.id == email.id)
+                    .with_for_update(nowait=True)
+                ).one()
+                locked.append(False)
+            except OperationalError:
+                locked.append(True)
+            assert not email_outbox_repository.claim_due(
+                other,
+                now=datetime.now(timezone.utc),
+                limit=10,
+                lease_until=datetime.now(timezone.utc),
+            )
+
+    worker = EmailOutboxWorker(SmtpMailer(host="localhost", port=0))
+    with patch.object(worker.mailer, "send", side_effect=send):
+        worker.run_once()
+    assert locked == [False]
+    db.refresh(email)
+    assert email.status == EMAIL_SENT
+
+
+def test_test_email_only_enqueues(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    email_to = random_email()
+    with (
+        patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
+        patch("app.services.email.SmtpMailer.send") as send,
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": email_to},
+        )
+    assert r.status_code == 201
+    send.assert_not_called()
+    queued = db.exec(select(EmailOutbox).where(EmailOutbox.email_to == email_to)).one()
+    assert queued.status == EMAIL_PENDING
+
+
+def test_templates_render_from_preloaded_environment() -> None:
+    preload_email_templates()
+    # 预加载之后渲染不再读取模板文件
+    with patch.object(
+        email_templates.loader, "get_source", side_effect=AssertionError("disk read")
+    ):
+        email_data = generate_new_account_email(
+            email_to="new@example.com", username="new@example.com", password="s3cret"
+        )
+    assert "new@example.com" in email_data.html_content
+    assert "s3cret" in email_data.html_content
+
+
+def test_missing_template_fails_at_startup() -> None:
+    with (
+        patch(
+            "app.utils.EMAIL_TEMPLATE_NAMES", (*EMAIL_TEMPLATE_NAMES, "missing.html")
+        ),
+        pytest.raises(TemplateNotFound),
+    ):
+        with TestClient(app):
+            pass
@@ -0,0 +1,29 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[list[str]]:
+    """
+    断言代码块内执行的 SQL 语句不超过 n 条
+
+    统计所有 Engine 上的语句（TestClient 在另一个线程中执行请求，无法按上下文区分），
+    失败时列出执行过的语句。
+    """
+    statements: list[str] = []
+
+    def _record(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        statements.append(" ".join(statement.split()))
+
+    event.listen(Engine, "after_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "after_cursor_execute", _record)
+    assert len(statements) <= n, (
+        f"Expected at most {n} queries, got {len(statements)}:\n"
+        + "\n".join(f"  {i}. {s}" for i, s in enumerate(statements, 1))
+    )
@@ -0,0 +1,72 @@
+import socketserver
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from email.message import Message
+
+
+@dataclass
+class SmtpSink:
+    """收集邮件的本地 SMTP 服务器（仅用于测试）"""
+
+    host: str = "127.0.0.1"
+    port: int = 0
+    messages: list[Message] = field(default_factory=list)
+    connections: int = 0
+    # 按收件人返回指定的 RCPT 响应，例如 {"x@example.com": "550 no such user"}
+    rcpt_responses: dict[str, str] = field(default_factory=dict)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        sink = self.server.sink
+        sink.connections += 1
+        self._reply("220 sink ready")
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 sink")
+            elif verb == "RCPT":
+                address = command.partition(":")[2].strip().strip("<>")
+                self._reply(sink.rcpt_responses.get(address, "250 OK"))
+            elif verb == "DATA":
+                self._reply("354 end with .")
+                data = b""
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    data += chunk[1:] if chunk.startswith(b"..") else chunk
+                sink.messages.append(message_from_bytes(data))
+                self._reply("250 queued")
+            elif verb == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    sink: SmtpSink
+
+
+@contextmanager
+def smtp_sink() -> Iterator[SmtpSink]:
+    sink = SmtpSink()
+    server = _Server((sink.host, 0), _Handler)
+    server.sink = sink
+    sink.port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield sink
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -24,6 +24,7 @@ def create_random_user(db: Session) -> User:
     password = random_lower_string()
     user_in = UserCreate(email=email, password=password)
     user = user_repository.create(db, obj_in=user_in)
+    db.commit()
     return user
 
 
@@ -45,5 +46,6 @@ def authentication_token_from_email(
         if not user.id:
             raise Exception("User id not set")
         user = user_repository.update(db, db_obj=user, obj_in=user_in_update)
+    db.commit()
 
     return user_authentication_headers(client=client, email=email, password=password)